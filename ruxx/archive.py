@@ -0,0 +1,144 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import pathlib
+import tarfile
+import zipfile
+from queue import SimpleQueue
+from threading import Condition, Lock, Thread
+
+from .defines import UTF8, ArchiveFormats
+
+__all__ = ('ArchiveSink',)
+
+
+class ArchiveSink:
+    """
+    Completed files are moved into rolling archives in destination folder, a new archive is started every 'max_items' files
+    (or every run if 0). Index file lists every archived file with its archive, so archived items are known without extracting.
+    Files are copied by a writer thread of its own, each one is indexed and removed as soon as its archive is valid again
+    """
+    def __init__(self, dest_base: pathlib.Path, fmt: str, max_items: int, prefix: str) -> None:
+        self.dest_base = dest_base
+        self.fmt = fmt
+        self.max_items = max_items
+        self.prefix = prefix
+        self.count = 0
+        self.error: OSError | None = None
+        self._index_path = dest_base / f'{prefix}!archive_index.txt'
+        self._members: dict[str, str] | None = None
+        self._tar: tarfile.TarFile | None = None
+        self._archive_name = ''
+        self._archive_items = 0
+        self._queue: SimpleQueue = SimpleQueue()
+        self._worker: Thread | None = None
+        self._pending = 0
+        self._cond = Condition()
+        self._lock: Lock = Lock()
+
+    def _load_index(self) -> dict[str, str]:
+        if self._members is None:
+            self._members = {}
+            if self._index_path.is_file():
+                with open(self._index_path, 'rt', encoding=UTF8) as index:
+                    for line in index:
+                        # member path, archive name
+                        member, _, archive_name = line.rstrip('\n').partition('\t')
+                        self._members[member] = archive_name
+        return self._members
+
+    def file_names(self, folder: pathlib.Path) -> list[str]:
+        """Names of archived files originally located within folder, including its subfolders"""
+        base = folder.relative_to(self.dest_base).as_posix() if folder != self.dest_base else ''
+        with self._lock:
+            return [pathlib.PurePosixPath(member).name for member in self._load_index()
+                    if not base or member.startswith(f'{base}/')]
+
+    def _open_next(self) -> None:
+        self._close_current()
+        ext = 'tar' if self.fmt == ArchiveFormats.TAR else 'zip'
+        seq = 1
+        while (self.dest_base / f'{self.prefix}!archive_{seq:04d}.{ext}').exists():
+            seq += 1
+        archive_name = f'{self.prefix}!archive_{seq:04d}.{ext}'
+        if self.fmt == ArchiveFormats.TAR:
+            self._tar = tarfile.open(self.dest_base / archive_name, 'w', format=tarfile.PAX_FORMAT)
+        self._archive_name = archive_name
+        self._archive_items = 0
+
+    def add(self, path: pathlib.Path) -> None:
+        """Queues file to be moved into current archive, raises if archiving has failed before"""
+        if self.error is not None:
+            raise self.error
+        with self._cond:
+            if self._worker is None:
+                self._worker = Thread(target=self._work, name='ArchiveWriter', daemon=True)
+                self._worker.start()
+            self._pending += 1
+        self._queue.put(path)
+
+    def _work(self) -> None:
+        while (path := self._queue.get()) is not None:
+            try:
+                if self.error is None:
+                    self._move(path)
+            except Exception as err:
+                # file stays in place, nothing further is archived
+                self.error = err if isinstance(err, OSError) else OSError(str(err))
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
+
+    def _move(self, path: pathlib.Path) -> None:
+        member = path.relative_to(self.dest_base).as_posix()
+        if not self._archive_name or (self.max_items and self._archive_items >= self.max_items):
+            self._open_next()
+        if self._tar is not None:
+            # tar is readable after every member, closing it only appends end-of-archive blocks
+            self._tar.add(path, member, recursive=False)
+            self._tar.fileobj.flush()
+        else:
+            # zip without central directory is unreadable, appending a member writes a new one
+            with zipfile.ZipFile(self.dest_base / self._archive_name, 'a', zipfile.ZIP_STORED, allowZip64=True) as zipf:
+                # media files are already compressed
+                zipf.write(path, member)
+        self._archive_items += 1
+        with self._lock:
+            self._load_index()[member] = self._archive_name
+            with open(self._index_path, 'at', encoding=UTF8, newline='\n') as index:
+                index.write(f'{member}\t{self._archive_name}\n')
+        path.unlink(missing_ok=True)
+        self.count += 1
+
+    def drain(self) -> None:
+        """Waits until every queued file is archived"""
+        with self._cond:
+            while self._pending > 0:
+                self._cond.wait()
+
+    def _close_current(self) -> None:
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+        self._archive_name = ''
+
+    def close(self) -> None:
+        with self._cond:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(None)
+            worker.join()
+        try:
+            self._close_current()
+        except OSError as err:
+            self.error = self.error or err
+
+#
+#
+#########################################
@@ -11,42 +11,65 @@ from argparse import ZERO_OR_MORE, ArgumentParser, Namespace
 from .defines import (
     ACTION_APPEND,
     ACTION_STORE_TRUE,
+    ARCHIVE_FORMATS,
     DMODE_CHOICES,
     DMODE_DEFAULT,
     MODULE_ABBR_RX,
     MODULE_CHOICES,
+    SCHEDULE_CHOICES,
+    SCHEDULE_DEFAULT,
+    SEGMENTS_MAX_FILE,
     THREADS_MAX_ITEMS,
 )
 from .gui_defines import (
     OPTION_CMD_APIKEY_CMD,
     OPTION_CMD_APPEND_SOURCE_AND_TAGS,
+    OPTION_CMD_ARCHIVE_CMD,
+    OPTION_CMD_ARCHIVE_ITEMS_CMD,
+    OPTION_CMD_BUDGET_CMD,
     OPTION_CMD_CACHE_PROCCED_HTML,
     OPTION_CMD_COOKIES_CMD,
     OPTION_CMD_DATEAFTER_CMD,
     OPTION_CMD_DATEBEFORE_CMD,
+    OPTION_CMD_DEADLINE_CMD,
     OPTION_CMD_DOWNLIMIT_CMD,
     OPTION_CMD_DOWNLOAD_ORDER,
     OPTION_CMD_DOWNMODE_CMD,
     OPTION_CMD_FNAMEPREFIX,
     OPTION_CMD_GET_MAXID_CMD,
     OPTION_CMD_HEADERS_CMD,
+    OPTION_CMD_HEDGE_CMD,
     OPTION_CMD_HIDE_PERSONAL_INFO,
+    OPTION_CMD_HOST_CONNECTIONS_CMD,
+    OPTION_CMD_HTML_CACHE_COMPRESS_CMD,
+    OPTION_CMD_HTML_CACHE_SIZE_CMD,
+    OPTION_CMD_HTTP_CACHE_CMD,
+    OPTION_CMD_HTTP_CACHE_TTL_CMD,
     OPTION_CMD_IGNORE_PROXY,
     OPTION_CMD_IMAGES,
     OPTION_CMD_INFO_SAVE_MODE,
+    OPTION_CMD_MAXSPEED_CMD,
+    OPTION_CMD_MINSPEED_CMD,
     OPTION_CMD_MODULE_CMD,
+    OPTION_CMD_NOHEAD_CMD,
     OPTION_CMD_PARCHI,
     OPTION_CMD_PATH_CMD,
     OPTION_CMD_PATH_SUB_IMG,
     OPTION_CMD_PATH_SUB_VID,
+    OPTION_CMD_POOL_THREADS_CMD,
     OPTION_CMD_PRESERVE_DATE,
     OPTION_CMD_PROXY_CMD,
+    OPTION_CMD_PROXY_LIST_CMD,
     OPTION_CMD_PROXY_NO_DOWNLOAD,
+    OPTION_CMD_RATELIMIT_CMD,
+    OPTION_CMD_RATELIMIT_SHARED_CMD,
     OPTION_CMD_RETRIES_CMD,
     OPTION_CMD_SAVE_COMMENTS,
     OPTION_CMD_SAVE_HASHES,
     OPTION_CMD_SAVE_SOURCES,
     OPTION_CMD_SAVE_TAGS,
+    OPTION_CMD_SCHEDULE_CMD,
+    OPTION_CMD_SEGMENTS_CMD,
     OPTION_CMD_THREADING_CMD,
     OPTION_CMD_TIMEOUT_CMD,
     OPTION_CMD_VERBOSE,
@@ -56,11 +79,15 @@ from .gui_defines import (
 from .help import (
     HELP_ARG_API_KEY,
     HELP_ARG_APPEND_SOURCE_AND_TAGS,
+    HELP_ARG_ARCHIVE,
+    HELP_ARG_ARCHIVE_ITEMS,
+    HELP_ARG_BUDGET,
     HELP_ARG_CACHE_HTML_BLOAT,
     HELP_ARG_CON_RETRIES,
     HELP_ARG_CON_TIMEOUT,
     HELP_ARG_COOKIE,
     HELP_ARG_COOKIES,
+    HELP_ARG_DEADLINE,
     HELP_ARG_DOWNLOAD_LIMIT,
     HELP_ARG_DOWNLOAD_MODE,
     HELP_ARG_DUMP_COMMENTS,
@@ -71,23 +98,38 @@ from .help import (
     HELP_ARG_GET_MAXID,
     HELP_ARG_HEADER,
     HELP_ARG_HEADERS,
+    HELP_ARG_HEDGE,
     HELP_ARG_HELP,
     HELP_ARG_HIDE_PERSONAL_INFO,
+    HELP_ARG_HOST_CONNECTIONS,
+    HELP_ARG_HTML_CACHE_COMPRESS,
+    HELP_ARG_HTML_CACHE_SIZE,
+    HELP_ARG_HTTP_CACHE,
+    HELP_ARG_HTTP_CACHE_TTL,
     HELP_ARG_INCLUDE_PARCHI,
     HELP_ARG_MAXDATE,
+    HELP_ARG_MAXSPEED,
     HELP_ARG_MERGE_LISTS,
     HELP_ARG_MINDATE,
+    HELP_ARG_MINSPEED,
     HELP_ARG_MODULE,
+    HELP_ARG_NOHEAD,
     HELP_ARG_NOPROXY,
     HELP_ARG_PATH,
+    HELP_ARG_POOL_THREADS,
     HELP_ARG_PREFER_LOWRES,
     HELP_ARG_PREFER_MP4,
     HELP_ARG_PREFER_WEBM,
     HELP_ARG_PREFIX,
     HELP_ARG_PRESERVE_DATE,
     HELP_ARG_PROXY,
+    HELP_ARG_PROXY_LIST,
     HELP_ARG_PROXYNODOWN,
+    HELP_ARG_RATELIMIT,
+    HELP_ARG_RATELIMIT_SHARED,
     HELP_ARG_REVERSE_DOWNLOAD_ORDER,
+    HELP_ARG_SCHEDULE,
+    HELP_ARG_SEGMENTS,
     HELP_ARG_SKIP_IMAGES,
     HELP_ARG_SKIP_VIDEOS,
     HELP_ARG_SUBFOLDER_IMAGES,
@@ -101,13 +143,21 @@ from .help import (
 from .module import ProcModule
 from .validators import (
     valid_api_key,
+    valid_byte_size,
     valid_date,
     valid_folder_name,
     valid_folder_path,
+    valid_host_connections,
+    valid_http_cache_ttl,
     valid_json,
     valid_kwarg,
+    valid_min_speed,
+    valid_pool_threads,
     valid_positive_int,
     valid_proxy,
+    valid_proxy_list,
+    valid_rate_limit,
+    valid_segment_count,
     valid_thread_count,
 )
 from .vcs import APP_NAME, APP_VERSION
@@ -158,8 +208,12 @@ def add_common_args(par: ArgumentParser) -> None:
     op.add_argument(dest='tags', nargs=ZERO_OR_MORE, action='extend', help=HELP_ARG_TAGS)
     co = par.add_argument_group(title='connection options')
     co.add_argument(OPTION_CMD_PROXY_CMD, metavar='#type://[user:pass@]a.d.d.r:port', help=HELP_ARG_PROXY, type=valid_proxy)
+    co.add_argument(OPTION_CMD_PROXY_LIST_CMD, metavar='#PATH', help=HELP_ARG_PROXY_LIST, type=valid_proxy_list)
     co.add_argument(OPTION_CMD_IGNORE_PROXY[True], action=ACTION_STORE_TRUE, help=HELP_ARG_NOPROXY)
     co.add_argument(OPTION_CMD_PROXY_NO_DOWNLOAD[True], action=ACTION_STORE_TRUE, help=HELP_ARG_PROXYNODOWN)
+    co.add_argument(OPTION_CMD_RATELIMIT_CMD, metavar='#RATE[,BURST]', help=HELP_ARG_RATELIMIT, type=valid_rate_limit)
+    co.add_argument(OPTION_CMD_RATELIMIT_SHARED_CMD, metavar='#PATH', help=HELP_ARG_RATELIMIT_SHARED, type=valid_folder_path)
+    co.add_argument(OPTION_CMD_HEDGE_CMD, action=ACTION_STORE_TRUE, help=HELP_ARG_HEDGE)
     co.add_argument(OPTION_CMD_TIMEOUT_CMD, metavar='#NUMBER', help=HELP_ARG_CON_TIMEOUT, type=valid_positive_int)
     co.add_argument(OPTION_CMD_RETRIES_CMD, metavar='#NUMBER', help=HELP_ARG_CON_RETRIES, type=valid_positive_int)
     co.add_argument(OPTION_CMD_HEADERS_CMD, metavar='#JSON', help=HELP_ARG_HEADERS, type=valid_json)
@@ -167,6 +221,11 @@ def add_common_args(par: ArgumentParser) -> None:
     co.add_argument(OPTION_CMD_HEADERS_CMD[:-1], metavar='#name=value', action=ACTION_APPEND, help=HELP_ARG_HEADER, type=valid_kwarg)
     co.add_argument(OPTION_CMD_COOKIES_CMD[:-1], metavar='#name=value', action=ACTION_APPEND, help=HELP_ARG_COOKIE, type=valid_kwarg)
     co.add_argument(OPTION_CMD_CACHE_PROCCED_HTML[True], action=ACTION_STORE_TRUE, help=HELP_ARG_CACHE_HTML_BLOAT)
+    co.add_argument(OPTION_CMD_HTML_CACHE_SIZE_CMD, metavar='#SIZE', help=HELP_ARG_HTML_CACHE_SIZE, type=valid_byte_size)
+    co.add_argument(OPTION_CMD_HTML_CACHE_COMPRESS_CMD, action=ACTION_STORE_TRUE, help=HELP_ARG_HTML_CACHE_COMPRESS)
+    co.add_argument(OPTION_CMD_HTTP_CACHE_CMD, metavar='#PATH', help=HELP_ARG_HTTP_CACHE, type=valid_folder_path)
+    co.add_argument(OPTION_CMD_HTTP_CACHE_TTL_CMD, metavar='#LIST,POST,COMMENTS[,404]', help=HELP_ARG_HTTP_CACHE_TTL,
+                    type=valid_http_cache_ttl)
     au = par.add_argument_group(title='authentication options')
     au.add_argument(OPTION_CMD_APIKEY_CMD, metavar='#KEY,USER_ID', help=HELP_ARG_API_KEY, type=valid_api_key)
     do = par.add_argument_group(title='download options')
@@ -181,6 +240,12 @@ def add_common_args(par: ArgumentParser) -> None:
     dom1.add_argument(OPTION_CMD_VIDEOS[2], action=ACTION_STORE_TRUE, help=HELP_ARG_PREFER_WEBM)
     do.add_argument(OPTION_CMD_IMAGES[1], action=ACTION_STORE_TRUE, help=HELP_ARG_PREFER_LOWRES)
     do.add_argument(OPTION_CMD_THREADING_CMD, metavar=f'1..{THREADS_MAX_ITEMS:d}', help=HELP_ARG_THREADS, type=valid_thread_count)
+    do.add_argument(OPTION_CMD_SEGMENTS_CMD, metavar=f'1..{SEGMENTS_MAX_FILE:d}', help=HELP_ARG_SEGMENTS, type=valid_segment_count)
+    do.add_argument(OPTION_CMD_POOL_THREADS_CMD, metavar='#PAGES,INFO,FILES', help=HELP_ARG_POOL_THREADS, type=valid_pool_threads)
+    do.add_argument(OPTION_CMD_HOST_CONNECTIONS_CMD, metavar='#LIST,ITEM,FILE', help=HELP_ARG_HOST_CONNECTIONS,
+                    type=valid_host_connections)
+    do.add_argument(OPTION_CMD_SCHEDULE_CMD, default=SCHEDULE_DEFAULT, help=HELP_ARG_SCHEDULE, choices=SCHEDULE_CHOICES)
+    do.add_argument(OPTION_CMD_NOHEAD_CMD, action=ACTION_STORE_TRUE, help=HELP_ARG_NOHEAD)
     doex = par.add_argument_group(title='extra download options')
     doex.add_argument(OPTION_CMD_SAVE_TAGS[True], action=ACTION_STORE_TRUE, help=HELP_ARG_DUMP_TAGS)
     doex.add_argument(OPTION_CMD_SAVE_SOURCES[True], action=ACTION_STORE_TRUE, help=HELP_ARG_DUMP_SOURCES)
@@ -190,9 +255,15 @@ def add_common_args(par: ArgumentParser) -> None:
     doexm1.add_argument(OPTION_CMD_INFO_SAVE_MODE[1], action=ACTION_STORE_TRUE, help=HELP_ARG_DUMP_PER_ITEM)
     doexm1.add_argument(OPTION_CMD_INFO_SAVE_MODE[2], action=ACTION_STORE_TRUE, help=HELP_ARG_MERGE_LISTS)
     doex.add_argument(OPTION_CMD_DOWNLIMIT_CMD, metavar='#NUMBER', default=0, help=HELP_ARG_DOWNLOAD_LIMIT, type=valid_positive_int)
+    doex.add_argument(OPTION_CMD_MAXSPEED_CMD, metavar='#SIZE', help=HELP_ARG_MAXSPEED, type=valid_byte_size)
+    doex.add_argument(OPTION_CMD_MINSPEED_CMD, metavar='#SIZE', help=HELP_ARG_MINSPEED, type=valid_min_speed)
+    doex.add_argument(OPTION_CMD_BUDGET_CMD, metavar='#SIZE', help=HELP_ARG_BUDGET, type=valid_byte_size)
+    doex.add_argument(OPTION_CMD_DEADLINE_CMD, metavar='#MINUTES', help=HELP_ARG_DEADLINE, type=valid_positive_int)
     doex.add_argument(OPTION_CMD_DOWNLOAD_ORDER[True], action=ACTION_STORE_TRUE, help=HELP_ARG_REVERSE_DOWNLOAD_ORDER)
     doex.add_argument(OPTION_CMD_DOWNMODE_CMD, default=DMODE_DEFAULT, help=HELP_ARG_DOWNLOAD_MODE, choices=DMODE_CHOICES)
     doex.add_argument(OPTION_CMD_PRESERVE_DATE[True], action=ACTION_STORE_TRUE, help=HELP_ARG_PRESERVE_DATE)
+    doex.add_argument(OPTION_CMD_ARCHIVE_CMD, help=HELP_ARG_ARCHIVE, choices=ARCHIVE_FORMATS)
+    doex.add_argument(OPTION_CMD_ARCHIVE_ITEMS_CMD, metavar='#NUMBER', default=0, help=HELP_ARG_ARCHIVE_ITEMS, type=valid_positive_int)
     dofi = par.add_argument_group(title='filtering options')
     dofi.add_argument(OPTION_CMD_DATEAFTER_CMD, metavar='#DD-MM-YYYY', help=HELP_ARG_MINDATE, type=valid_date)
     dofi.add_argument(OPTION_CMD_DATEBEFORE_CMD, metavar='#DD-MM-YYYY', help=HELP_ARG_MAXDATE, type=valid_date)
@@ -0,0 +1,103 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from threading import Condition, local
+
+__all__ = ('AdaptiveConcurrency',)
+
+_stage = local()
+
+
+class StageSlot:
+    """Slot taken in a stage, shared with helper threads of its holder"""
+    def __init__(self, controller: AdaptiveConcurrency) -> None:
+        self.controller = controller
+        self.overloaded = False
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit: grows by one per 'limit' healthy completions, halves on overload"""
+    def __init__(self, name: str, start: int, ceiling: int, poll: Callable[[], None],
+                 decrease_factor=0.5, decrease_cooldown=1.0) -> None:
+        self.name = name
+        self.ceiling = max(1, ceiling)
+        self.limit = float(max(1, min(start, self.ceiling)))
+        self.peak = self.limit
+        self.cuts = 0
+        self._poll = poll
+        self._decrease_factor = decrease_factor
+        self._decrease_cooldown = decrease_cooldown
+        self._last_cut = 0.0
+        self._in_flight = 0
+        self._cond = Condition()
+
+    @staticmethod
+    def current() -> AdaptiveConcurrency | None:
+        """Controller of the stage this thread is working in"""
+        stage_slot: StageSlot | None = getattr(_stage, 'slot', None)
+        return stage_slot.controller if stage_slot else None
+
+    @staticmethod
+    def current_slot() -> StageSlot | None:
+        return getattr(_stage, 'slot', None)
+
+    @staticmethod
+    @contextmanager
+    def joined(stage_slot: StageSlot | None) -> Iterator[None]:
+        """Helper thread works within the slot of another thread, overloads it reports count for that slot"""
+        _stage.slot = stage_slot
+        try:
+            yield
+        finally:
+            _stage.slot = None
+
+    @staticmethod
+    def report_overload() -> None:
+        if stage_slot := AdaptiveConcurrency.current_slot():
+            stage_slot.overloaded = True
+            stage_slot.controller.on_overload()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._poll()
+                self._cond.wait(0.5)
+            self._in_flight += 1
+        stage_slot = _stage.slot = StageSlot(self)
+        try:
+            yield
+        finally:
+            _stage.slot = None
+            with self._cond:
+                self._in_flight -= 1
+                if not stage_slot.overloaded:
+                    self.limit = min(float(self.ceiling), self.limit + 1.0 / self.limit)
+                    self.peak = max(self.peak, self.limit)
+                self._cond.notify_all()
+
+    def on_overload(self) -> None:
+        with self._cond:
+            # one burst of rejections is one congestion event
+            now = time.monotonic()
+            if now - self._last_cut >= self._decrease_cooldown:
+                self._last_cut = now
+                self.limit = max(1.0, self.limit * self._decrease_factor)
+                self.cuts += 1
+
+    def __str__(self) -> str:
+        return f'{self.name}: {int(self.limit):d} (peak {int(self.peak):d} / {self.ceiling:d}, {self.cuts:d} cut(s))'
+
+#
+#
+#########################################
@@ -168,10 +168,39 @@ class DownloadModes:
     FULL = 'full'
     SKIP = 'skip'
     TOUCH = 'touch'
+    ARIA2 = 'aria2'
+    JSONL = 'jsonl'
 
 
 DMODE_DEFAULT = DownloadModes.FULL
-DMODE_CHOICES = (DownloadModes.FULL, DownloadModes.SKIP, DownloadModes.TOUCH)
+DMODE_CHOICES = (DownloadModes.FULL, DownloadModes.SKIP, DownloadModes.TOUCH, DownloadModes.ARIA2, DownloadModes.JSONL)
+# nothing is downloaded, resolved files are listed for external downloader
+DMODES_MANIFEST = (DownloadModes.ARIA2, DownloadModes.JSONL)
+
+
+class ScheduleModes:
+    ID = 'id'
+    SMALL_FIRST = 'small'
+    LARGE_FIRST = 'large'
+
+
+SCHEDULE_DEFAULT = ScheduleModes.ID
+SCHEDULE_CHOICES = (ScheduleModes.ID, ScheduleModes.SMALL_FIRST, ScheduleModes.LARGE_FIRST)
+
+
+class ArchiveFormats:
+    TAR = 'tar'
+    ZIP = 'zip'
+
+
+ARCHIVE_FORMATS = (ArchiveFormats.TAR, ArchiveFormats.ZIP)
+
+
+class ProxyUses:
+    ALL = ''
+    PAGES = 'pages'
+    FILES = 'files'
+
 
 STATE_WORK_START = DownloaderStates.SEARCHING
 
@@ -191,11 +220,48 @@ STATUSBAR_INFO_MAP: dict[DownloaderStates, tuple[str, str | None, str | None, st
 
 CONNECT_TIMEOUT_BASE = 10
 CONNECT_RETRIES_BASE = 10
-CONNECT_RETRIES_CHUNK = 5
+HEDGE_RATE_MAX = 0.05  # duplicate requests per request
+HEDGE_MIN_SAMPLES = 20
+HEDGE_QUANTILE = 0.95
+HEDGE_LATENCY_WINDOW = 200
+HEDGE_THREADS_MAX = 128  # 3 pools of up to THREADS_MAX_POOL callers each, plus their duplicates
+DEFERRED_RETRY_TRIES = 1  # file tries before item is deferred to the retry pass
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_CAP = 30.0
+RETRY_AFTER_MAX = 120.0
+CIRCUIT_FAILURES_MAX = 5  # consecutive overload failures before host is closed
+CIRCUIT_COOLDOWN_BASE = 5.0
+CIRCUIT_COOLDOWN_MAX = 60.0
+PROXY_FAILURES_MAX = 3  # consecutive failures before proxy is quarantined
+PROXY_QUARANTINE_BASE = 30.0
+PROXY_QUARANTINE_MAX = 600.0
+MIRROR_FAILURES_MAX = 2  # files failed in a row before file host is avoided
+MIRROR_BAN_SECONDS = 900.0
+MIRROR_MIN_SAMPLES = 3
 
 THREADS_MAX_ITEMS = 8
+THREADS_MAX_POOL = 32
+HOST_CONNECTIONS_MAX = 64
+SEGMENTS_MAX_FILE = 8
 DOWNLOAD_CHUNK_SIZE = 2097152  # 2 Mb
 WRITE_CHUNK_SIZE = 524288  # 512 Kb
+DOWNLOAD_CHUNK_SIZE_MIN = 524288  # 512 Kb
+DOWNLOAD_CHUNK_SIZE_MAX = 16777216  # 16 Mb
+TRANSFER_CHUNK_SECONDS = 4.0  # chunk size is adapted to take about this long
+TRANSFER_MIN_SPEED = 10240  # 10 Kb/s
+TRANSFER_STALL_WINDOW = 10.0
+TRANSFER_READ_TIMEOUT_MIN = 3.0
+TRANSFER_READ_TIMEOUT_FACTOR = 4.0
+BANDWIDTH_READ_SIZE_MIN = 16384  # 16 Kb
+DISK_WRITER_THREADS = 2
+# rough file size estimation for scheduling when size is not listed
+SCHEDULE_IMAGE_BYTES_PER_PIXEL = 0.4
+SCHEDULE_VIDEO_BYTES_PER_PIXEL = 12.0
+SCHEDULE_IMAGE_SIZE_DEFAULT = 1048576  # 1 Mb
+SCHEDULE_VIDEO_SIZE_DEFAULT = 20971520  # 20 Mb
+DISK_WRITER_QUEUE_SIZE = 33554432  # 32 Mb
+PARTIAL_FILE_EXT = '.part'
+PARTIAL_META_EXT = '.part.meta'
 
 SITENAME_B_RX = 'aHR0cHM6Ly9hcGkucnVsZTM0Lnh4eC8='
 SITENAME_B_RN = 'aHR0cHM6Ly9ydWxlMzRoZW50YWkubmV0Lw=='
@@ -311,6 +377,42 @@ class HtmlCacheMode(IntEnum):
     CACHE_BS = auto()  # cache BeautifulSoup objects
 
 
+HTML_CACHE_SIZE_DEFAULT = 256 * Mem.MB
+HTML_CACHE_HOT_HITS = 2  # hits before a parsed tree is kept for the entry
+HTML_CACHE_PARSED_SIZE_FACTOR = 8  # estimated parsed tree size per source byte
+
+
+# noinspection PyArgumentList
+class HttpCacheClass(IntEnum):
+    LISTING = auto()
+    ITEM = auto()
+    COMMENTS = auto()
+
+
+# seconds a stored response is used without revalidation, 0 is always revalidate
+HTTP_CACHE_TTLS: dict[int, int] = {
+    HttpCacheClass.LISTING: 600,
+    HttpCacheClass.ITEM: 7 * 86400,
+    HttpCacheClass.COMMENTS: 86400,
+}
+HTTP_CACHE_TTL_MISSING = 86400
+
+
+# noinspection PyArgumentList
+class ConnectionPools(IntEnum):
+    LISTING = auto()
+    ITEM = auto()
+    FILE = auto()
+
+
+# simultaneous connections per host, API hosts and file CDNs tolerate very different loads
+HOST_CONNECTIONS: dict[int, int] = {
+    ConnectionPools.LISTING: 4,
+    ConnectionPools.ITEM: 8,
+    ConnectionPools.FILE: 32,
+}
+
+
 class APIKey:
     __slots__ = ('key', 'user_id')
 
@@ -8,6 +8,7 @@ Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
 
 from __future__ import annotations
 
+import heapq
 import itertools
 import json
 import os
@@ -17,36 +18,48 @@ import time
 from abc import abstractmethod
 from argparse import Namespace
 from collections import deque
-from collections.abc import Callable, Iterable, MutableSet
+from collections.abc import Callable, Iterable, MutableSet, Sequence
 from dataclasses import asdict
 from multiprocessing.dummy import Pool, current_process
 from multiprocessing.pool import ThreadPool
 from threading import Lock
 
+from .archive import ArchiveSink
+from .concurrency import AdaptiveConcurrency
 from .defines import (
     CONNECT_TIMEOUT_BASE,
     DATE_MAX_DEFAULT,
     DATE_MIN_DEFAULT,
+    DEFERRED_RETRY_TRIES,
+    DMODES_MANIFEST,
     INT_BOUNDS_DEFAULT,
     PLATFORM_WINDOWS,
+    SCHEDULE_IMAGE_BYTES_PER_PIXEL,
+    SCHEDULE_IMAGE_SIZE_DEFAULT,
+    SCHEDULE_VIDEO_BYTES_PER_PIXEL,
+    SCHEDULE_VIDEO_SIZE_DEFAULT,
     SOURCE_DEFAULT,
     UTF8,
     APIKey,
+    ConnectionPools,
     DownloaderOptions,
     DownloaderStates,
     DownloadModes,
     ItemInfo,
     Mem,
     ModuleConfigType,
+    ScheduleModes,
     ThreadInterruptException,
 )
-from .download_base import DownloaderBase
+from .download_base import DeferredDownload, DownloaderBase
 from .file_parser import prepare_item_infos_dict
 from .gui_defines import NEWLINE, OPTION_CMD_APIKEY_CMD, UNDERSCORE
 from .logger import trace
+from .manifest import ManifestWriter
 from .module import ProcModule
 from .network import DownloadInterruptException, ThreadedHtmlWorker, thread_exit
-from .rex import re_favorited_by_tag, re_infolist_filename, re_pool_tag
+from .ratelimit import RateLimiter, SharedRateLimiter
+from .rex import re_favorited_by_tag, re_file_size, re_infolist_filename, re_item_height, re_item_width, re_pool_tag
 from .tagger import append_filtered_tags
 from .tags_parser import convert_taglist
 from .tagsdb import load_tag_aliases
@@ -80,6 +93,8 @@ class Downloader(DownloaderBase):
         self._thread_exception_lock = Lock()
         self._thread_exceptions: dict[str, list[str]] = {}
         self._file_name_ext_cache: dict[str, tuple[str, str]] = {}
+        self.page_concurrency: AdaptiveConcurrency | None = None
+        self.item_concurrency: AdaptiveConcurrency | None = None
 
     @property
     def total_count_all(self) -> int:
@@ -99,9 +114,15 @@ class Downloader(DownloaderBase):
         # self._file_name_ext_cache.clear()  # do not
         self.raw_html_cache.clear()
         self.filtered_out_ids_cache.clear()
-        if self.session:
-            self.session.close()
-            self.session = None
+        self.close_session_pools()
+        self.disk_writer.close()
+        if self.manifest:
+            self.manifest.close()
+            self.manifest = None
+        if self.archive:
+            self.archive.close()
+        if self.hedger:
+            self.hedger.close()
         self._thread_exceptions.clear()
 
     # threaded
@@ -112,9 +133,37 @@ class Downloader(DownloaderBase):
             self._thread_exceptions[thread_name].append(format_exception('full'))
             self.my_root_thread.killed = True
 
+    def _is_concurrent(self) -> bool:
+        return max(self.maxthreads_pages, self.maxthreads_info, self.maxthreads_files) > 1
+
+    def _concurrency_str(self) -> str:
+        host_limits = '/'.join(f'{limiter.limit:d}' for limiter in self.host_limiters.values())
+        return (f'up to {self.maxthreads_pages:d}/{self.maxthreads_info:d}/{self.maxthreads_files:d} thread(s)'
+                f' (pages/info/files), {host_limits} per host (list/item/file)')
+
+    def _make_concurrency(self, name: str, maxthreads: int, pool: ConnectionPools) -> AdaptiveConcurrency:
+        # starts at half the threads, but not above what the stage's host connection pool allows
+        host_limit = self.host_limiters[pool].limit if pool in self.host_limiters else maxthreads
+        return AdaptiveConcurrency(name, min(maxthreads // 2, host_limit), maxthreads, self.catch_cancel_or_ctrl_c)
+
+    def _run_concurrently(self, func: Callable[..., None], args_list: Sequence[tuple], concurrency: AdaptiveConcurrency) -> None:
+        def run_adaptive(*args) -> None:
+            with concurrency.slot():
+                func(*args)
+
+        active_pool: ThreadPool
+        with Pool(concurrency.ceiling) as active_pool:
+            ress = deque(active_pool.apply_async(run_adaptive, args=args) for args in args_list)
+            while len(ress) > 0:
+                self.catch_cancel_or_ctrl_c()
+                while len(ress) > 0 and ress[0].ready():
+                    ress.popleft()
+                time.sleep(0.2)
+        trace(f'Concurrency {concurrency!s}')
+
     # threaded
     def _inc_proc_count(self) -> None:
-        if self.maxthreads_items > 1:
+        if self._is_concurrent():
             with self.item_lock:
                 self.processed_count += 1
         else:
@@ -165,27 +214,53 @@ class Downloader(DownloaderBase):
         return f'{item_abbrname}{add_string}'
 
     # threaded
-    def _download(self, link: str, item_id: str, dest: pathlib.Path) -> None:
-        if self.download_mode != DownloadModes.SKIP:
+    def _download(self, link: str, item_id: str, dest: pathlib.Path, size_hint=0, md5='', attempts=0, delay=0.0) -> None:
+        if self.manifest:
+            self.manifest.add(link, dest, size_hint, md5)
+            with self.item_lock:
+                self.success_count += 1
+            trace(f'[{current_process().name}] {item_id}... listed', True)
+            return
+
+        # folders are created once per download run, not per item
+        if self.download_mode != DownloadModes.SKIP and dest.parent not in self.created_dirs:
             with self.item_lock:
                 try:
                     dest.parent.mkdir(parents=True, exist_ok=True)
                 except OSError:
                     thread_exit('ERROR: Unable to create subfolder!')
+                self.created_dirs.add(dest.parent)
 
+        # a failing file does not hold the worker: after a few tries it is deferred until the retry pass
+        tries = min(self.retries - attempts, DEFERRED_RETRY_TRIES)
         try:
-            result = self.download_file(link, item_id, dest, self.download_mode, self.preserve_date)
+            result = self.download_file(link, item_id, dest, self.download_mode, self.preserve_date, size_hint, md5, tries)
         except DownloadInterruptException:
             return
+        attempts += result.retries
 
         if self.download_mode == DownloadModes.TOUCH or 0 < result.file_size == result.expected_size:
-            result.result_str = f'{result.result_str}done ({result.file_size / Mem.MB:.2f} Mb)'
+            result.result_str = f'{result.result_str}done ({result.file_size / Mem.MB:.2f} Mb{", md5 ok" if md5 else ""})'
+            if self.archive:
+                try:
+                    self.archive.add(dest)
+                except OSError:
+                    thread_exit(f'ERROR: Unable to add {dest.name} to archive!')
             with self.item_lock:
                 self.success_count += 1
+                # hash computed while downloading is saved with item info unless the website provided one
+                if result.md5 and (item_info := self.item_info_dict_all.get(item_id)) and not item_info.md5:
+                    item_info.md5 = result.md5
+        elif attempts < self.retries and not self.is_killed():
+            delay = self.retry_policy.backoff(delay)
+            trace(f'{result.result_str}deferred, next try in {delay:.1f} sec ({attempts:d} / {self.retries:d})', True)
+            with self.item_lock:
+                heapq.heappush(self.deferred_items, DeferredDownload((link, item_id, dest, size_hint, md5), attempts, delay))
+            return
         else:
             result.result_str = f'{result.result_str}failed'
-            if result.retries >= self.retries:
-                result.result_str = f'{result.result_str} (could not download file after {result.retries + 1:d} tries)'
+            if attempts >= self.retries:
+                result.result_str = f'{result.result_str} (could not download file after {attempts:d} tries)'
             with self.item_lock:
                 self.fail_count += 1
                 self.failed_items.append(item_id)
@@ -206,6 +281,17 @@ class Downloader(DownloaderBase):
     def _process_item(self, raw: str) -> None:
         ...
 
+    # threaded
+    def _process_item_within_budget(self, raw: str) -> None:
+        if reason := self.budget.exhausted():
+            with self.item_lock:
+                if not self.unscheduled_items:
+                    trace(f'{reason}. No more items will be scheduled, waiting for active downloads...', True)
+                self.unscheduled_items.append(f'{self._get_module_abbr_p()}{self._extract_id(self._local_addr_from_string(raw))}')
+            self._inc_proc_count()
+            return
+        self._process_item(raw)
+
     # threaded
     def _get_page_items(self, n: int, c_page: int, page_max: int) -> None:
         if self.is_killed():
@@ -230,6 +316,7 @@ class Downloader(DownloaderBase):
                         raise ConnectionError
 
                     if self._is_search_overload_page(raw_html_page):
+                        AdaptiveConcurrency.report_overload()
                         trace(f'Warning (W2): search was dropped on page {pnum:d} (too many threads?), retrying...', True)
                         raise KeyError
 
@@ -253,8 +340,6 @@ class Downloader(DownloaderBase):
             with self.items_all_lock:
                 self.total_count = sum(len(self.items_raw_per_page[_]) for _ in self.items_raw_per_page)
 
-            if ProcModule.is_rp() or ProcModule.is_en() or ProcModule.is_xb() or ProcModule.is_bb():
-                time.sleep(1.0)
         except Exception:
             self._on_thread_exception(current_process().name)
             raise
@@ -330,18 +415,10 @@ class Downloader(DownloaderBase):
             self.total_count_old = self.total_count
             self.total_count = 0
 
-            if self.maxthreads_items > 1 and self._num_pages() > 1:
-                trace(f'  ...using {self.maxthreads_items:d} threads...')
+            if self._is_concurrent() and self._num_pages() > 1:
+                trace(f'  ...using {self._concurrency_str()}...')
                 arr_temp = [(n, n - self.minpage + 1, self.maxpage) for n in range(self.minpage, self.maxpage + 1)]
-
-                active_pool: ThreadPool
-                with Pool(max(2, self.maxthreads_items // (4 if ProcModule.is_rp() else 2))) as active_pool:
-                    ress = deque(active_pool.apply_async(self._get_page_items, args=larr) for larr in arr_temp)
-                    while len(ress) > 0:
-                        self.catch_cancel_or_ctrl_c()
-                        while len(ress) > 0 and ress[0].ready():
-                            ress.popleft()
-                        time.sleep(0.2)
+                self._run_concurrently(self._get_page_items, arr_temp, self.page_concurrency)
             else:
                 for n in range(self.minpage, self.maxpage + 1):
                     self.catch_cancel_or_ctrl_c()
@@ -504,30 +581,96 @@ class Downloader(DownloaderBase):
             else:
                 trace('\nShrinking queue down is not required!')
 
+        if self.schedule != ScheduleModes.ID:
+            trace(f'\nScheduling {"smaller" if self.schedule == ScheduleModes.SMALL_FIRST else "larger"} files first...')
+            # stable sort, items of equal size keep id order
+            self.items_raw_all.sort(key=self._estimate_item_size, reverse=self.schedule == ScheduleModes.LARGE_FIRST)
+
         minmax_ids = self._extract_minmax_id()
         trace(f'\nProcessing {self.total_count_all:d} item(s), bound {minmax_ids[0]:d} to {minmax_ids[1]:d}')
 
+        if self.download_mode in DMODES_MANIFEST:
+            self._open_manifest(minmax_ids)
+
         load_tag_aliases()
 
         self.current_state = DownloaderStates.DOWNLOADING
-        trace(f'{self.total_count_all:d} item(s) scheduled, {self.maxthreads_items:d} thread(s) max\nWorking...\n')
+        self.created_dirs.clear()
+        trace(f'{self.total_count_all:d} item(s) scheduled, {self._concurrency_str()}\nWorking...\n')
 
-        if self.maxthreads_items > 1 and self.total_count_all > 1:
-            active_pool: ThreadPool
-            with Pool(self.maxthreads_items) as active_pool:
-                ress = deque(active_pool.apply_async(self._process_item, args=(iarr,)) for iarr in self.items_raw_all)
-                while len(ress) > 0:
-                    self.catch_cancel_or_ctrl_c()
-                    while len(ress) > 0 and ress[0].ready():
-                        ress.popleft()
-                    time.sleep(0.2)
+        if self._is_concurrent() and self.total_count_all > 1:
+            self._run_concurrently(self._process_item_within_budget, [(iraw,) for iraw in self.items_raw_all], self.item_concurrency)
         else:
             for iraw in self.items_raw_all:
                 self.catch_cancel_or_ctrl_c()
-                self._process_item(iraw)
+                self._process_item_within_budget(iraw)
+
+        self._retry_deferred()
+
+        if self.manifest:
+            self.manifest.close()
+            trace(f'\n{self.manifest.count:d} file(s) listed in \'{self.manifest.path.as_posix()}\'')
+            self.manifest = None
+        if self.archive:
+            # next run starts a new archive
+            self.archive.close()
+            trace(f'\n{self.archive.count:d} file(s) archived')
+            if self.archive.error:
+                trace(f'Warning (W3): archiving stopped: {self.archive.error}, remaining files are kept as is')
 
         skip_all = self.download_mode == DownloadModes.SKIP
         trace(f'\nAll {"skipped" if skip_all else "processed"} ({self.total_count_all:d} item(s))...')
+        if self.unscheduled_items:
+            trace(f'{len(self.unscheduled_items):d} item(s) were not scheduled: {self.budget.exhausted() or "budget exhausted"}')
+
+    def _open_manifest(self, minmax_ids: tuple[int, int]) -> None:
+        try:
+            self.dest_base_s.mkdir(parents=True, exist_ok=True)
+        except Exception:
+            thread_exit(f'ERROR: Unable to create folder {self.dest_base_s}!')
+        ext = 'txt' if self.download_mode == DownloadModes.ARIA2 else 'jsonl'
+        manifest_path = self.dest_base_s / f'{self._get_module_abbr_p()}!manifest_{minmax_ids[0]:d}-{minmax_ids[1]:d}.{ext}'
+        use_proxy = self.proxies and not self.ignore_proxy and not self.ignore_proxy_dwn
+        proxy = self.proxies['http'] if use_proxy else ''
+        self.manifest = ManifestWriter(manifest_path, self.download_mode, self.session_headers(), dict(self.add_cookies), proxy)
+
+    def _retry_deferred(self) -> None:
+        while self.deferred_items:
+            self.catch_cancel_or_ctrl_c()
+            if reason := self.budget.exhausted():
+                trace(f'{reason}. {len(self.deferred_items):d} deferred item(s) will not be retried')
+                with self.item_lock:
+                    self.fail_count += len(self.deferred_items)
+                    self.failed_items.extend(deferred.args[1] for deferred in self.deferred_items)
+                    self.deferred_items.clear()
+                break
+            now = time.monotonic()
+            with self.item_lock:
+                ready_items: list[DeferredDownload] = []
+                while self.deferred_items and self.deferred_items[0].ready_at <= now:
+                    ready_items.append(heapq.heappop(self.deferred_items))
+            if not ready_items:
+                self._wait_interruptible(min(1.0, self.deferred_items[0].ready_at - now))
+                continue
+            trace(f'\nRetrying {len(ready_items):d} deferred item(s)...')
+            args_list = [(*deferred.args, deferred.attempts, deferred.delay) for deferred in ready_items]
+            if self._is_concurrent() and len(args_list) > 1:
+                self._run_concurrently(self._download, args_list, self.item_concurrency)
+            else:
+                for args in args_list:
+                    self.catch_cancel_or_ctrl_c()
+                    self._download(*args)
+
+    def _estimate_item_size(self, raw: str) -> int:
+        """Expected file size: listed or estimated by resolution"""
+        if size_m := re_file_size.search(raw):
+            return int(size_m.group(1))
+        is_video = self._is_video(raw)
+        width_m, height_m = re_item_width.search(raw), re_item_height.search(raw)
+        if width_m and height_m:
+            bpp = SCHEDULE_VIDEO_BYTES_PER_PIXEL if is_video else SCHEDULE_IMAGE_BYTES_PER_PIXEL
+            return int(int(width_m.group(1)) * int(height_m.group(1)) * bpp)
+        return SCHEDULE_VIDEO_SIZE_DEFAULT if is_video else SCHEDULE_IMAGE_SIZE_DEFAULT
 
     def _extract_negative_and_groups(self) -> None:
         split_always = self._split_or_group_into_tasks_always()
@@ -556,6 +699,7 @@ class Downloader(DownloaderBase):
         trace(f'\n{BR}\n{APP_NAME} core ver {APP_VERSION}')
         trace(f'Starting {self._get_module_abbr().upper()} downloader', timestamp=True)
         trace(f'\nDownload mode: \'{self.download_mode}\'')
+        trace(f'Rate limit: {self.rate_limiter!s}')
         trace(f'{len(self.neg_and_groups):d} \'excluded tags combination\' custom filter(s) parsed')
         trace(f'{self._tasks_count():d} task(s) scheduled:\n{NEWLINE.join(self.tags_str_arr)}\n\n{BR}')
         self.current_task_num = 0
@@ -591,9 +735,24 @@ class Downloader(DownloaderBase):
         total_files = min(self.success_count + self.fail_count, self.total_count_all)
         success_files = min(self.success_count, self.total_count_all - self.fail_count)
         trace(f'\n{self._tasks_count():d} task(s) completed, {success_files:d} / {total_files:d} item(s) succeded', False, True)
+        if self.verbose:
+            trace(f'Connections: {self.connection_stats!s}')
+            trace(f'Page cache: {self.raw_html_cache!s}')
+            trace(f'Retries: {self.retry_policy!s}')
+            if self.hedger:
+                trace(f'Hedging: {self.hedger!s}')
+            if self.proxy_pool:
+                trace(f'Proxies: {self.proxy_pool!s}')
+            trace(f'File hosts: {self.mirror_health!s}')
+            trace(f'Coalescing: {self.fetches!s}')
+            if self.http_cache:
+                trace(f'HTTP cache: {self.http_cache!s}')
         if len(self.failed_items) > 0:
             trace(f'{len(self.failed_items):d} failed item(s):')
             trace('\n'.join(self.failed_items))
+        if len(self.unscheduled_items) > 0:
+            trace(f'{len(self.unscheduled_items):d} skipped item(s):')
+            trace('\n'.join(self.unscheduled_items))
 
     def _check_tags(self) -> None:
         if self._tasks_count() > 1:
@@ -630,7 +789,7 @@ class Downloader(DownloaderBase):
             trace(f'Unhandled exception: {format_exception("row")}', True)
         finally:
             self.current_state = DownloaderStates.IDLE
-        if self._thread_exceptions and self.maxthreads_items > 1:
+        if self._thread_exceptions and self._is_concurrent():
             n = '\n'
             trace(f'Catched thread exception(s):\n{n.join(n.join(self._thread_exceptions[exck]) for exck in self._thread_exceptions)}')
 
@@ -663,6 +822,9 @@ class Downloader(DownloaderBase):
         self.download_mode = args.dmode or self.download_mode
         self.download_limit = args.dlimit or self.download_limit
         self.reverse_download_order = args.reverse or self.reverse_download_order
+        self.schedule = args.schedule or self.schedule
+        self.archive_format = args.archive or self.archive_format
+        self.archive_items = args.archive_items or self.archive_items
         self.maxthreads_items = args.threads or self.maxthreads_items
         self.include_parchi = args.include_parchi or self.include_parchi
         self.skip_images = args.skip_img or self.skip_images
@@ -674,6 +836,8 @@ class Downloader(DownloaderBase):
         self.date_max = args.maxdate or self.date_max
         self.preserve_date = args.preserve_date or self.preserve_date
         self.dest_base = args.path or self.dest_base
+        self.archive = (ArchiveSink(self.dest_base, self.archive_format, self.archive_items, self._get_module_abbr_p())
+                        if self.archive_format else None)
         self.subfolder_vid = args.vidsub or self.subfolder_vid
         self.subfolder_img = args.imgsub or self.subfolder_img
         self.warn_nonempty = args.warn_nonempty or self.warn_nonempty
@@ -687,6 +851,11 @@ class Downloader(DownloaderBase):
         self._parse_tags()
         if self._solve_argument_conflicts():
             time.sleep(2.0)
+        maxthreads_pages = max(2, self.maxthreads_items // (4 if ProcModule.is_rp() else 2)) if self.maxthreads_items > 1 else 1
+        pool_threads = args.pool_threads or (maxthreads_pages, self.maxthreads_items, self.maxthreads_items)
+        self.maxthreads_pages, self.maxthreads_info, self.maxthreads_files = pool_threads
+        self.page_concurrency = self._make_concurrency('pages', self.maxthreads_pages, ConnectionPools.LISTING)
+        self.item_concurrency = self._make_concurrency('items', self.maxthreads_files, ConnectionPools.FILE)
 
     def _solve_argument_conflicts(self) -> bool:
         # fatal
@@ -730,11 +899,10 @@ class Downloader(DownloaderBase):
                 trace('Warning (W1): RS module is unable to filter by date. Disabled!')
                 self.date_min, self.date_max = DATE_MIN_DEFAULT, DATE_MAX_DEFAULT
                 ret = True
-        if ProcModule.is_en():
-            if self.dump_comments and self.maxthreads_items > 2 and not self.check_tags and not self.get_max_id:
-                trace('Warning (W1): EN module can\'t fetch comments faster than 2/sec due to API limitation. Forcing 2 download threads!')
-                self.maxthreads_items = 2
-                ret = True
+        if isinstance(self.rate_limiter, SharedRateLimiter) and self.rate_limiter.rate <= 0.0:
+            trace(f'Warning (W1): \'-ratelimit_shared\' requires \'-ratelimit\' for \'{ProcModule.name().upper()}\' module. Ignored!')
+            self.rate_limiter = RateLimiter(0.0, 0)
+            ret = True
         if ProcModule.is_xb() or ProcModule.is_bb():
             if self.dump_comments:
                 trace('Warning (W1): XB and BB module comments collection is disabled.')
@@ -762,14 +930,14 @@ class Downloader(DownloaderBase):
                         trace(f'Info: extract info {abbrp}{item_info.id}: trailing space in field \'{key}\': {val}!')
 
         abbrp = self._get_module_abbr_p()
-        if self._can_extract_item_info_without_fetch() or self.maxthreads_items < 2 or len(self.items_raw_per_task) < 2:
+        if self._can_extract_item_info_without_fetch() or self.maxthreads_info < 2 or len(self.items_raw_per_task) < 2:
             for item in self.items_raw_per_task:
                 self.catch_cancel_or_ctrl_c()
                 res = self._extract_item_info(item)
                 put_info(res)
         else:  # RS
             active_pool: ThreadPool
-            with Pool(self.maxthreads_items) as active_pool:
+            with Pool(self.maxthreads_info) as active_pool:
                 ress = deque(active_pool.apply_async(self._extract_item_info, args=(elem,)) for elem in self.items_raw_per_task)
                 while len(ress) > 0:
                     self.catch_cancel_or_ctrl_c()
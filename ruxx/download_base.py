@@ -6,20 +6,27 @@ Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
 #
 #
 
+from __future__ import annotations
+
 import os
 import pathlib
 import re
+import time
 from abc import abstractmethod
 from collections.abc import MutableSet
 from typing import final
 
 from bs4 import BeautifulSoup
 
+from .archive import ArchiveSink
 from .defines import (
     DATE_MAX_DEFAULT,
     DATE_MIN_DEFAULT,
     LAUCH_DATE,
     NEGATIVE_GROUP_MATCH_LIST_MAX_LEN,
+    PARTIAL_FILE_EXT,
+    PARTIAL_META_EXT,
+    SCHEDULE_DEFAULT,
     APIKey,
     DownloaderStates,
     DownloadModes,
@@ -28,10 +35,25 @@ from .defines import (
     PageCheck,
 )
 from .logger import trace
+from .manifest import ManifestWriter
 from .network import ThreadedHtmlWorker, thread_exit
 from .utils import as_date
 
 
+class DeferredDownload:
+    """Failed file download waiting for its next attempt"""
+    __slots__ = ('args', 'attempts', 'delay', 'ready_at')
+
+    def __init__(self, args: tuple, attempts: int, delay: float) -> None:
+        self.args = args
+        self.attempts = attempts
+        self.delay = delay
+        self.ready_at = time.monotonic() + delay
+
+    def __lt__(self, other: DeferredDownload) -> bool:
+        return self.ready_at < other.ready_at
+
+
 class DownloaderBase(ThreadedHtmlWorker):
     """DownloaderBase !Abstract!"""
     @abstractmethod
@@ -51,7 +73,15 @@ class DownloaderBase(ThreadedHtmlWorker):
         self.download_mode: str = DownloadModes.FULL
         self.download_limit: int = 0
         self.reverse_download_order: bool = False
+        self.schedule: str = SCHEDULE_DEFAULT
+        self.archive_format: str = ''
+        self.archive_items: int = 0
         self.maxthreads_items: int = 1
+        self.manifest: ManifestWriter | None = None
+        self.archive: ArchiveSink | None = None
+        self.maxthreads_pages: int = 1
+        self.maxthreads_info: int = 1
+        self.maxthreads_files: int = 1
         self.include_parchi: bool = False
         self.skip_images: bool = False
         self.skip_videos: bool = False
@@ -80,6 +110,9 @@ class DownloaderBase(ThreadedHtmlWorker):
         self.success_count: int = 0
         self.fail_count: int = 0
         self.failed_items: list[str] = []
+        self.unscheduled_items: list[str] = []
+        self.created_dirs: set[pathlib.Path] = set()
+        self.deferred_items: list[DeferredDownload] = []
         self.total_count: int = 0
         self.total_count_old: int = 0
         self.processed_count: int = 0
@@ -659,11 +692,13 @@ class DownloaderBase(ThreadedHtmlWorker):
     def _filter_existing_items(self) -> None:
         trace('Filtering out existing items...')
 
-        if not self.dest_base_s.is_dir():
-            return
-
-        with os.scandir(self.dest_base_s.as_posix()) as listing:
-            curdirfiles = [f.name for f in listing if f.is_file()]
+        curdirfiles: list[str] = []
+        if self.dest_base_s.is_dir():
+            with os.scandir(self.dest_base_s.as_posix()) as listing:
+                # partially downloaded files are going to be resumed
+                curdirfiles.extend(f.name for f in listing if f.is_file() and not f.name.endswith((PARTIAL_FILE_EXT, PARTIAL_META_EXT)))
+        if self.archive:
+            curdirfiles.extend(self.archive.file_names(self.dest_base_s))
 
         if len(curdirfiles) == 0:
             return
@@ -10,7 +10,6 @@ import base64
 import datetime
 import json
 import re
-import time
 from collections.abc import MutableSet
 from multiprocessing.dummy import current_process
 from typing import Final, NoReturn, final
@@ -31,6 +30,7 @@ from .defines import (
     TAGS_CONCAT_CHAR_EN,
     Comment,
     DownloadModes,
+    HttpCacheClass,
     ItemInfo,
 )
 from .download import Downloader
@@ -39,6 +39,8 @@ from .logger import trace
 from .network import thread_exit
 from .rex import (
     re_favorited_by_tag,
+    re_file_md5,
+    re_file_size,
     re_item_info_part_xml,
     re_orig_file_link,
     re_sample_file_link,
@@ -124,6 +126,7 @@ class DownloaderEn(Downloader):
             pfile = p['file'] or p['sample']['alternates'].get('original')
             assert pfile
             post_md5 = pfile['md5']
+            post_fsize = str(pfile.get('size') or 0)
             try:
                 post_furl = (pfile['url'] if 'url' in pfile else
                              str((next(filter(None, pfile['urls'])) or p['file']['url']) if 'urls' in pfile else None))
@@ -147,7 +150,8 @@ class DownloaderEn(Downloader):
             post_fdate = str(p['created_at'] or '2024-01-01T09:28:22.753-04:00')
             post_comment_count = str(p['comment_count'] or 0)
             post_str = (
-                f'<post_id="{post_id}" height="{post_fheight}" width="{post_fwidth}" md5="{post_md5}" file_url="{post_furl}" '
+                f'<post_id="{post_id}" height="{post_fheight}" width="{post_fwidth}" md5="{post_md5}" file_size="{post_fsize}" '
+                f'file_url="{post_furl}" '
                 f'sample_url="{post_surl}" created_at="{post_fdate}" score="{post_score}" has_children="{post_haschildren}" '
                 f'parent_id="{post_parent_id}" comment_count="{post_comment_count}" source="{post_source}" tags="{post_tags}">'
             )
@@ -190,7 +194,6 @@ class DownloaderEn(Downloader):
             while not 0 < last_count < self._get_items_per_page():
                 if (page == MAX_SEARCH_DEPTH_PAGES - 1 and last_count == self._get_items_per_page()) or (page == 0 and last_count == 0):
                     break
-                time.sleep(1.0)
                 page += min(MAX_SEARCH_DEPTH_PAGES - 1, max(MAX_SEARCH_DEPTH_PAGES // divider, 1)) * direction
                 if __RUXX_DEBUG__:
                     trace(f'page {page + 1:d}...')
@@ -297,7 +300,11 @@ class DownloaderEn(Downloader):
         address, fmt = self._get_video_address(raw) if is_video else self._get_image_address(raw)
         subfolder = self.subfolder_vid if is_video else self.subfolder_img
         hint_maxlen = FILE_NAME_FULL_MAX_LEN - (len(self.dest_base_s.as_posix()) + len(item_id) + 1 + len(fmt))
-        self._download(address, item_id, self.dest_base_s / subfolder / f'{self._try_append_extra_info(item_id, hint_maxlen)}.{fmt}')
+        # listed size and hash are only valid for the original file
+        is_orig = address == self.extract_file_url(raw)[0]
+        size_hint, md5 = (self.extract_file_size(raw), self.extract_md5(raw)) if is_orig else (0, '')
+        self._download(address, item_id, self.dest_base_s / subfolder / f'{self._try_append_extra_info(item_id, hint_maxlen)}.{fmt}',
+                       size_hint, md5)
 
     # threaded
     def _process_item(self, raw: str) -> None:
@@ -309,7 +316,7 @@ class DownloaderEn(Downloader):
             item_id = self._extract_id(h)
 
             if self.dump_comments is True and self.extract_comment_count(h) > 0:
-                raw_html = self.fetch_html(self._form_comments_search_address(item_id))
+                raw_html = self.fetch_html(self._form_comments_search_address(item_id), req_class=HttpCacheClass.COMMENTS)
                 if raw_html is None:
                     trace(f'Warning (W3): ProcItem: unable to retreive comments for {item_id}!', True)
                 else:
@@ -359,6 +366,16 @@ class DownloaderEn(Downloader):
         assert count_str.isnumeric()
         return int(count_str)
 
+    @staticmethod
+    def extract_file_size(h: str) -> int:
+        size_re_res = re_file_size.search(h)
+        return int(size_re_res.group(1)) if size_re_res else 0
+
+    @staticmethod
+    def extract_md5(h: str) -> str:
+        md5_re_res = re_file_md5.search(h)
+        return md5_re_res.group(1) if md5_re_res else ''
+
     @staticmethod
     def extract_file_url(h: str) -> tuple[str, str]:
         if file_re_res := re_orig_file_link.search(h):
@@ -18,7 +18,7 @@ from .download import Downloader
 from .logger import trace
 from .module import ProcModule
 from .network import thread_exit
-from .rex import re_item_info_part_xml, re_orig_file_link, re_sample_file_link
+from .rex import re_file_md5, re_item_info_part_xml, re_orig_file_link, re_sample_file_link
 
 __all__ = ('DownloaderGelbooru',)
 
@@ -230,7 +230,10 @@ class DownloaderGelbooru(Downloader):
         address, fmt = self._get_video_address(raw) if is_video else self._get_image_address(raw)
         subfolder = self.subfolder_vid if is_video else self.subfolder_img
         hint_maxlen = FILE_NAME_FULL_MAX_LEN - (len(self.dest_base_s.as_posix()) + len(item_id) + 1 + len(fmt))
-        self._download(address, item_id, self.dest_base_s / subfolder / f'{self._try_append_extra_info(item_id, hint_maxlen)}.{fmt}')
+        # listed md5 is of the original file, not of the sample
+        md5 = self.extract_md5(raw) if address == self.extract_file_url(raw)[0] else ''
+        self._download(address, item_id, self.dest_base_s / subfolder / f'{self._try_append_extra_info(item_id, hint_maxlen)}.{fmt}',
+                       md5=md5)
 
     def _form_tags_search_address(self, tags: str, maxlim: int | None = None) -> str:
         return (f'{self._get_sitename()}index.php?page=favorites&s=view&id={self.favorites_search_user}' if self.favorites_search_user else
@@ -287,6 +290,11 @@ class DownloaderGelbooru(Downloader):
             file_url = file_ext = ''
         return file_url, file_ext
 
+    @staticmethod
+    def extract_md5(h: str) -> str:
+        md5_re_res = re_file_md5.search(h)
+        return md5_re_res.group(1) if md5_re_res else ''
+
     @staticmethod
     def has_comments(h: str) -> bool:
         id_idx = h.find(' has_comments="') + len(' has_comments="')
@@ -25,6 +25,7 @@ from .defines import (
     TAGS_CONCAT_CHAR_RN,
     Comment,
     DownloadModes,
+    HttpCacheClass,
     ItemInfo,
 )
 from .download import Downloader
@@ -248,7 +249,7 @@ class DownloaderRn(Downloader):
 
             raw_html = BeautifulSoup()
             if self.download_mode != DownloadModes.SKIP or self.dump_sources or self.dump_comments:
-                raw_html = self.fetch_html(f'{self._get_sitename()}{h}', True)
+                raw_html = self.fetch_html(f'{self._get_sitename()}{h}', True, req_class=HttpCacheClass.ITEM)
                 if raw_html is None:
                     trace(f'ERROR: ProcItem: unable to retreive html for {item_id}!', True)
                     self._inc_proc_count()
@@ -24,7 +24,9 @@ from .defines import (
     SITENAME_B_RP,
     TAGS_CONCAT_CHAR_RP,
     Comment,
+    ConnectionPools,
     DownloadModes,
+    HttpCacheClass,
     ItemInfo,
 )
 from .download import Downloader
@@ -267,7 +269,7 @@ class DownloaderRp(Downloader):
             item_id = self._extract_id(h)
 
             if self.dump_comments is True:
-                raw_html = self.fetch_html(f'{self._get_sitename()}post/view/{item_id}')
+                raw_html = self.fetch_html(f'{self._get_sitename()}post/view/{item_id}', req_class=HttpCacheClass.ITEM)
                 if raw_html is None:
                     trace(f'ERROR: ProcItem: unable to retreive html for {item_id}!', True)
                     self._inc_proc_count()
@@ -333,7 +335,7 @@ class DownloaderRp(Downloader):
                         break
             if not 3 <= len(value) <= 4:
                 trace(f'Warning (W2): can\'t extract format for {fullid} from filename, fetching content type...', True)
-                r = self.wrap_request(file_url, tries=self.retries, method='HEAD')
+                r = self.wrap_request(file_url, tries=self.retries, method='HEAD', pool=ConnectionPools.FILE)
                 if r is not None:
                     content_type = r.headers.get('Content-Type', '')
                     value = EXT_PET_CONTENT_TYPE.get(content_type, value)
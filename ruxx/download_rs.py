@@ -24,6 +24,7 @@ from .defines import (
     TAGS_CONCAT_CHAR_RS,
     Comment,
     DownloadModes,
+    HttpCacheClass,
     ItemInfo,
 )
 from .download import Downloader
@@ -243,7 +244,7 @@ class DownloaderRs(Downloader):
 
             raw_html = BeautifulSoup()
             if self.download_mode != DownloadModes.SKIP or self.dump_comments is True:
-                raw_html = self.fetch_html(h)
+                raw_html = self.fetch_html(h, req_class=HttpCacheClass.ITEM)
                 if raw_html is None:
                     trace(f'ERROR: ProcItem: unable to retreive html for {item_id}!', True)
                     self._inc_proc_count()
@@ -285,7 +286,7 @@ class DownloaderRs(Downloader):
         cpages = max(int(a.text) for a in comment_page_as) if comment_page_as else 1
         for cpage in range(cpages):
             if cpage > 0:
-                raw_html = self.fetch_html(self._form_comments_search_address(item_id, cpage))
+                raw_html = self.fetch_html(self._form_comments_search_address(item_id, cpage), req_class=HttpCacheClass.COMMENTS)
             comment_divs = raw_html.find_all('div', class_='commentBox')
             for comment_div in comment_divs:
                 author_a = comment_div.find('a', href=re_comment_a_rs)
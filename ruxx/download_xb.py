@@ -18,6 +18,7 @@ from .defines import (
     SITENAME_B_XB,
     TAGS_CONCAT_CHAR_XB,
     Comment,
+    HttpCacheClass,
 )
 from .download_gelbooru import DownloaderGelbooru
 from .logger import trace
@@ -81,7 +82,7 @@ class DownloaderXb(DownloaderGelbooru):
         return ID_VALUE_SEPARATOR_CHAR_XB
 
     def _extract_comments(self, item_id: str) -> None:
-        if raw_html := self.fetch_html(self._form_comments_search_address(item_id)):
+        if raw_html := self.fetch_html(self._form_comments_search_address(item_id), req_class=HttpCacheClass.COMMENTS):
             full_item_id = f'{self._get_module_abbr_p() if self.add_filename_prefix else ""}{item_id}'
             comment_divs = raw_html.find_all('comment')
             for comment_div in comment_divs:
@@ -66,6 +66,7 @@ OPTION_CMD_APIKEY_CMD = '-api_key'
 OPTION_CMD_COOKIES_CMD = '-cookies'
 OPTION_CMD_HEADERS_CMD = '-headers'
 OPTION_CMD_PROXY_CMD = '-proxy'
+OPTION_CMD_PROXY_LIST_CMD = '-proxy_list'
 OPTION_CMD_IGNORE_PROXY = ('', '-noproxy')
 OPTION_CMD_PROXY_NO_DOWNLOAD = ('', '-proxynodown')
 OPTION_CMD_CACHE_PROCCED_HTML = ('', '-cache_html_bloat')
@@ -74,7 +75,7 @@ OPTION_CMD_RETRIES_CMD = '-retries'
 OPTION_CMD_FNAMEPREFIX = ('', '-prefix')
 OPTION_CMD_DOWNMODE_CMD = '-dmode'
 OPTION_CMD_DOWNLIMIT_CMD = '-dlimit'
-OPTION_CMD_DOWNMODE = ('', 'skip', 'touch')
+OPTION_CMD_DOWNMODE = ('', 'skip', 'touch', 'aria2', 'jsonl')
 OPTION_CMD_PRESERVE_DATE = ('', '-preserve_date')
 OPTION_CMD_SAVE_TAGS = ('', '-dump_tags')
 OPTION_CMD_SAVE_SOURCES = ('', '-dump_sources')
@@ -92,6 +93,24 @@ OPTION_CMD_PATH_SUB_IMG = '-imgsub'
 OPTION_CMD_MODULE_CMD = '-module'
 # non-gui
 OPTION_CMD_GET_MAXID_CMD = '-get_maxid'
+OPTION_CMD_SEGMENTS_CMD = '-segments'
+OPTION_CMD_POOL_THREADS_CMD = '-pool_threads'
+OPTION_CMD_HOST_CONNECTIONS_CMD = '-host_conns'
+OPTION_CMD_NOHEAD_CMD = '-nohead'
+OPTION_CMD_HEDGE_CMD = '-hedge'
+OPTION_CMD_SCHEDULE_CMD = '-schedule'
+OPTION_CMD_ARCHIVE_CMD = '-archive'
+OPTION_CMD_ARCHIVE_ITEMS_CMD = '-archive_items'
+OPTION_CMD_RATELIMIT_CMD = '-ratelimit'
+OPTION_CMD_RATELIMIT_SHARED_CMD = '-ratelimit_shared'
+OPTION_CMD_MAXSPEED_CMD = '-maxspeed'
+OPTION_CMD_MINSPEED_CMD = '-minspeed'
+OPTION_CMD_BUDGET_CMD = '-budget'
+OPTION_CMD_DEADLINE_CMD = '-deadline'
+OPTION_CMD_HTTP_CACHE_CMD = '-http_cache'
+OPTION_CMD_HTTP_CACHE_TTL_CMD = '-http_cache_ttl'
+OPTION_CMD_HTML_CACHE_SIZE_CMD = '-html_cache_size'
+OPTION_CMD_HTML_CACHE_COMPRESS_CMD = '-html_cache_compress'
 # Sizes
 PADDING_DEFAULT = 2
 PADDING_ROOTFRAME_I = PADDING_DEFAULT
@@ -0,0 +1,120 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import TypeVar
+from urllib import parse as url_parse
+
+from .defines import HEDGE_LATENCY_WINDOW, HEDGE_MIN_SAMPLES, HEDGE_QUANTILE, HEDGE_RATE_MAX, HEDGE_THREADS_MAX
+
+__all__ = ('Hedger',)
+
+RT = TypeVar('RT')
+
+
+class Hedger:
+    """
+    Hedged requests: if a response is late compared to recent latencies of the host (p95),
+    a duplicate request is sent and whichever finishes first is used. Duplicates are capped by rate
+    """
+    def __init__(self, poll: Callable[[], None], max_rate=HEDGE_RATE_MAX, min_samples=HEDGE_MIN_SAMPLES) -> None:
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._poll = poll
+        self._latencies: dict[str, deque[float]] = {}
+        self._lock: Lock = Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def deadline(self, url: str) -> float:
+        """Seconds to wait before hedging, 0 if there is not enough data yet"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(self._host(url), ()))
+        return latencies[int(len(latencies) * HEDGE_QUANTILE)] if len(latencies) >= self.min_samples else 0.0
+
+    def _record(self, url: str, latency: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(self._host(url), deque(maxlen=HEDGE_LATENCY_WINDOW)).append(latency)
+
+    def _take_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.requests * self.max_rate:
+                return False
+            self.hedges += 1
+            return True
+
+    def _return_hedge(self) -> bool:
+        with self._lock:
+            self.hedges -= 1
+        return False
+
+    def _wait(self, futures: list[Future], timeout: float) -> set[Future]:
+        # interruptible wait
+        deadline = time.monotonic() + timeout
+        while True:
+            self._poll()
+            done, _ = wait(futures, timeout=max(0.0, min(0.5, deadline - time.monotonic())), return_when=FIRST_COMPLETED)
+            if done or time.monotonic() >= deadline:
+                return done
+
+    def run(self, url: str, send: Callable[[], RT], allow: Callable[[], bool]) -> RT:
+        """Calls 'send' once or twice, 'allow' is asked right before sending a duplicate"""
+        with self._lock:
+            self.requests += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(HEDGE_THREADS_MAX, 'Hedger')
+
+        def send_primary() -> RT:
+            # measured from actual start, not from submit. Late primary response still counts,
+            # otherwise hedging would shrink its own deadline
+            start = time.monotonic()
+            result = send()
+            self._record(url, time.monotonic() - start)
+            return result
+
+        deadline = self.deadline(url)
+        primary = self._executor.submit(send_primary)
+        # hedge budget is given back if duplicate is not allowed
+        if not self._wait([primary], deadline or float('inf')) and self._take_hedge() and (allow() or self._return_hedge()):
+            hedge = self._executor.submit(send)
+            done = self._wait([primary, hedge], float('inf'))
+            winner = primary if primary in done and primary.exception() is None else hedge if hedge in done else primary
+            if winner.exception() is not None:
+                # first one failed, the other one still may succeed
+                other = hedge if winner is primary else primary
+                self._wait([other], float('inf'))
+                winner = other if other.exception() is None else winner
+            if winner is hedge:
+                with self._lock:
+                    self.hedge_wins += 1
+            return winner.result()
+        self._wait([primary], float('inf'))
+        return primary.result()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return url_parse.urlparse(url).hostname or ''
+
+    def __str__(self) -> str:
+        return f'{self.hedges:d} hedged of {self.requests:d} request(s), {self.hedge_wins:d} won by hedge'
+
+#
+#
+#########################################
@@ -20,8 +20,14 @@ APP_BUILD_TYPE_STR = 'Debug' if __RUXX_DEBUG__ else 'Release'
 HELP_ARG_HELP = 'Print this message'
 HELP_ARG_VERSION = 'Show program version string and exit'
 HELP_ARG_MODULE = 'Download module to use, default is \'rx\''
-HELP_ARG_DOWNLOAD_MODE = '[Debug] Download mode, default is \'full\''
+HELP_ARG_DOWNLOAD_MODE = ('[Debug] Download mode, default is \'full\'. \'aria2\' and \'jsonl\' do not download anything,'
+                          ' resolved files are written to a manifest in destination folder instead')
 HELP_ARG_DOWNLOAD_LIMIT = 'Maximum number of posts to download, default is \'0\' (disabled)'
+HELP_ARG_MAXSPEED = 'Maximum total download speed in bytes per second (K, M, G suffixes allowed), default is unlimited'
+HELP_ARG_MINSPEED = ('Reconnect when a file transfer stays slower than this many bytes per second for 10 seconds'
+                     ' (K, M, G suffixes allowed), \'0\' disables, default is \'10K\'')
+HELP_ARG_BUDGET = 'Stop scheduling new downloads after this many bytes are downloaded (K, M, G suffixes allowed)'
+HELP_ARG_DEADLINE = 'Stop scheduling new downloads after this many minutes'
 HELP_ARG_REVERSE_DOWNLOAD_ORDER = 'Download in reverse order (highest id to lowest, unless changed by sort:X type tags)'
 HELP_ARG_SKIP_IMAGES = 'Skip all images'
 HELP_ARG_SKIP_VIDEOS = 'Skip all videos'
@@ -35,12 +41,28 @@ HELP_ARG_PRESERVE_DATE = 'Preserve original modification date for saved files'
 HELP_ARG_MINDATE = 'Skip everything posted before this date, default is \'01-01-1970\''
 HELP_ARG_MAXDATE = 'Skip everything posted after this date, default is \'<today>\''
 HELP_ARG_THREADS = 'Maximum simultaneous downloads (affects pages scan too), default is \'1\''
+HELP_ARG_SEGMENTS = 'Maximum simultaneous connections per file, large files are fetched in segments, default is \'1\''
+HELP_ARG_POOL_THREADS = ('Threads for pages scan, item info and file downloads, overrides sizes derived from \'-threads\','
+                         ' example: \'2,4,32\'')
+HELP_ARG_HOST_CONNECTIONS = ('Simultaneous connections per host for listing pages, item pages and files,'
+                             ' default is \'4,8,32\'')
+HELP_ARG_ARCHIVE = 'Move downloaded files into tar or zip archives in destination folder, archived files are indexed and not downloaded again'
+HELP_ARG_ARCHIVE_ITEMS = 'Start a new archive every this many files, default is \'0\' (one archive per run)'
+HELP_ARG_SCHEDULE = ('Download order: by id, smaller files first or larger files first'
+                     ' (listed file size or estimation by resolution), default is \'id\'')
+HELP_ARG_HEDGE = 'Send a duplicate page request if response is late compared to recent ones (p95), at most 5% of requests'
+HELP_ARG_NOHEAD = 'Do not send HEAD request before downloading a file, file size is taken from the first response instead'
 HELP_ARG_PATH = 'Full path to destination folder, default is \'<current folder>\''
 HELP_ARG_SUBFOLDER_VIDEOS = 'Subfolder name to download videos into'
 HELP_ARG_SUBFOLDER_IMAGES = 'Subfolder name to download images into'
 HELP_ARG_PROXY = 'Proxy server address'
+HELP_ARG_PROXY_LIST = ('Text file with proxy addresses, one per line, optionally followed by \'pages\' or \'files\' to only use it for'
+                       ' that, requests are spread across healthy proxies, overrides \'-proxy\'')
 HELP_ARG_NOPROXY = 'Ignore proxy during this run'
 HELP_ARG_PROXYNODOWN = 'Do not use proxy for downloads, only for search'
+HELP_ARG_RATELIMIT = 'Maximum requests per second (and burst) per host, a file download counts as one request, default depends on module'
+HELP_ARG_RATELIMIT_SHARED = ('Folder to share rate limit through, all processes using the same folder stay within one limit per host'
+                             ' together')
 HELP_ARG_CON_TIMEOUT = 'Connection timeout (in seconds), default is \'10\''
 HELP_ARG_CON_RETRIES = 'Connection retries count is case of fail, default is \'10\''
 HELP_ARG_API_KEY = 'API authentication info'
@@ -58,6 +80,11 @@ HELP_ARG_MERGE_LISTS = 'Merge exising tags/sources/comments files(s) with saved
 HELP_ARG_APPEND_SOURCE_AND_TAGS = 'Append a shortened representation of major tags to file name'
 HELP_ARG_WARN_NON_EMPTY_FOLDER = 'In GUI mode, warn if download folder is not empty'
 HELP_ARG_VERBOSE = 'Enable verbose logging'
+HELP_ARG_HTTP_CACHE = 'Folder to keep fetched pages in between runs, stale pages are revalidated using ETag / Last-Modified'
+HELP_ARG_HTTP_CACHE_TTL = ('Minutes a cached listing page, post page, comments page and 404 response are used without revalidation,'
+                           ' default is \'10,10080,1440,1440\'')
+HELP_ARG_HTML_CACHE_SIZE = 'Memory limit for pages cached during this run (K, M, G suffixes allowed), default is \'256M\''
+HELP_ARG_HTML_CACHE_COMPRESS = 'Compress pages cached in memory, saves memory at the cost of some speed'
 HELP_ARG_CACHE_HTML_BLOAT = 'Cache processed HTML instead of raw bytes, can be faster but increases memory usage'
 HELP_ARG_TAGS = 'Tags to search for, required'
 # GUI help messages
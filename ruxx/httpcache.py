@@ -0,0 +1,120 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import hashlib
+import json
+import os
+import pathlib
+import time
+from threading import Lock, get_ident
+
+from .defines import UTF8
+
+__all__ = ('HttpCache', 'HttpCacheEntry')
+
+HTTP_CACHE_META_EXT = '.json'
+HTTP_CACHE_BODY_EXT = '.body'
+
+
+class HttpCacheEntry:
+    __slots__ = ('body', 'etag', 'last_modified', 'status', 'stored')
+
+    def __init__(self, status: int, etag: str, last_modified: str, stored: float, body: bytes) -> None:
+        self.status = status
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored = stored
+        self.body = body
+
+    def validators(self) -> dict[str, str]:
+        """Conditional request headers, missing (404) entries are always re-fetched in full"""
+        headers: dict[str, str] = {}
+        if self.status == 200:
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """Disk response cache keyed by url hash, fresh entries are used as is, stale ones are revalidated"""
+    def __init__(self, root: pathlib.Path, ttls: dict[int, int], ttl_missing: int) -> None:
+        self.root = root
+        self.ttls = ttls
+        self.ttl_missing = ttl_missing
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.missing_hits = 0
+        self._lock: Lock = Lock()
+
+    def _path(self, url: str) -> pathlib.Path:
+        # url is not stored, it may contain api key
+        digest = hashlib.sha1(url.encode(UTF8)).hexdigest()
+        return self.root / digest[:2] / digest
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, url: str) -> HttpCacheEntry | None:
+        path = self._path(url)
+        try:
+            with open(path.with_suffix(HTTP_CACHE_META_EXT), 'rt', encoding=UTF8) as metafile:
+                meta: dict[str, int | float | str] = json.load(metafile)
+            body = path.with_suffix(HTTP_CACHE_BODY_EXT).read_bytes() if meta['status'] == 200 else b''
+            return HttpCacheEntry(int(meta['status']), str(meta['etag']), str(meta['last_modified']), float(meta['stored']), body)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_fresh(self, entry: HttpCacheEntry, req_class: int) -> bool:
+        ttl = self.ttl_missing if entry.status == 404 else self.ttls.get(req_class, 0)
+        fresh = time.time() - entry.stored < ttl
+        if fresh:
+            self._count('missing_hits' if entry.status == 404 else 'hits')
+        return fresh
+
+    def put(self, url: str, status: int, body: bytes, etag='', last_modified='') -> None:
+        self._store(url, status, body, etag, last_modified)
+        self._count('misses')
+
+    def put_missing(self, url: str) -> None:
+        self.put(url, 404, b'')
+
+    def refresh(self, url: str, entry: HttpCacheEntry, etag='', last_modified='') -> None:
+        """Not modified (304) response: keep the body, restart entry lifetime"""
+        self._store(url, entry.status, entry.body, etag or entry.etag, last_modified or entry.last_modified)
+        self._count('revalidated')
+
+    def _store(self, url: str, status: int, body: bytes, etag: str, last_modified: str) -> None:
+        path = self._path(url)
+        entry = HttpCacheEntry(status, etag or '', last_modified or '', time.time(), body)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if status == 200:
+                self._write(path.with_suffix(HTTP_CACHE_BODY_EXT), body)
+            meta = {slot: getattr(entry, slot) for slot in HttpCacheEntry.__slots__ if slot != 'body'}
+            self._write(path.with_suffix(HTTP_CACHE_META_EXT), json.dumps(meta).encode(UTF8))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _write(path: pathlib.Path, data: bytes) -> None:
+        # other threads may read the same entry, replace it atomically
+        tmp_path = path.with_name(f'{path.name}.{os.getpid():d}.{get_ident():d}')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def __str__(self) -> str:
+        return (f'{self.hits:d} hit(s), {self.revalidated:d} revalidated, {self.missing_hits:d} cached 404(s),'
+                f' {self.misses:d} miss(es)')
+
+#
+#
+#########################################
@@ -0,0 +1,60 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import json
+import pathlib
+from threading import Lock
+
+from .defines import UTF8, DownloadModes
+
+__all__ = ('ManifestWriter',)
+
+
+class ManifestWriter:
+    """
+    Resolved downloads written out for an external transfer tool instead of being downloaded,
+    one entry per file as soon as it is resolved: aria2 input file or json lines.
+    No file is requested, so size is only known if listed (EN module), '0' otherwise
+    """
+    def __init__(self, path: pathlib.Path, fmt: str, headers: dict[str, str], cookies: dict[str, str], proxy: str) -> None:
+        self.path = path
+        self.fmt = fmt
+        self.headers = headers
+        self.cookies = cookies
+        self.proxy = proxy
+        self.count = 0
+        self._lock: Lock = Lock()
+        self._file = open(path, 'wt', encoding=UTF8, newline='\n')
+
+    def add(self, url: str, dest: pathlib.Path, size: int, md5: str) -> None:
+        if self.fmt == DownloadModes.ARIA2:
+            lines = [url, f'  dir={dest.parent.as_posix()}', f'  out={dest.name}']
+            if md5:
+                lines.append(f'  checksum=md5={md5}')
+            lines.extend(f'  header={name}: {value}' for name, value in self.headers.items())
+            if self.cookies:
+                lines.append(f'  header=Cookie: {"; ".join(f"{name}={value}" for name, value in self.cookies.items())}')
+            if self.proxy:
+                lines.append(f'  all-proxy={self.proxy}')
+            entry = '\n'.join(lines)
+        else:
+            entry = json.dumps({'url': url, 'path': dest.as_posix(), 'size': size, 'md5': md5,
+                                'headers': self.headers, 'cookies': self.cookies, 'proxy': self.proxy}, ensure_ascii=False)
+        with self._lock:
+            # flushed per entry, so transfers may start while resolution is still going
+            self._file.write(f'{entry}\n')
+            self._file.flush()
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+#
+#
+#########################################
@@ -0,0 +1,93 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import time
+from collections.abc import Sequence
+from threading import Lock
+from urllib import parse as url_parse
+
+from .defines import MIRROR_BAN_SECONDS, MIRROR_FAILURES_MAX, MIRROR_MIN_SAMPLES
+from .throughput import HostThroughput
+
+__all__ = ('MirrorHealth',)
+
+
+class MirrorState:
+    __slots__ = ('banned_until', 'failures', 'successes', 'total_failures')
+
+    def __init__(self) -> None:
+        self.successes = 0
+        self.failures = 0
+        self.total_failures = 0
+        self.banned_until = 0.0
+
+    def success_rate(self) -> float:
+        return (self.successes + 1) / (self.successes + self.total_failures + 2)
+
+
+class MirrorHealth:
+    """
+    Per-host outcome of file transfers over the run, used to choose between alternative sources of the same file:
+    host failing several files in a row is avoided for a while, among proven hosts the most productive one is used
+    """
+    def __init__(self, throughput: HostThroughput, failures_max=MIRROR_FAILURES_MAX) -> None:
+        self.throughput = throughput
+        self.failures_max = failures_max
+        self.bans = 0
+        self.redirects = 0
+        self._hosts: dict[str, MirrorState] = {}
+        self._lock: Lock = Lock()
+
+    def pick(self, links: Sequence[str]) -> str:
+        """Best of the links to the same file, first one is preferred while there is no reason to avoid it"""
+        if len(links) < 2:
+            return links[0]
+        now = time.monotonic()
+        with self._lock:
+            states = [self._hosts.get(self._host(link)) or MirrorState() for link in links]
+        usable = [(link, state) for link, state in zip(links, states, strict=True) if state.banned_until <= now]
+        if not usable:
+            # everything is banned, the one released soonest is the least bad
+            best = min(zip(links, states, strict=True), key=lambda ls: ls[1].banned_until)[0]
+        elif all(state.successes >= MIRROR_MIN_SAMPLES for _, state in usable):
+            best = max(usable, key=lambda ls: ls[1].success_rate() * self.throughput.speed(ls[0]))[0]
+        else:
+            best = usable[0][0]
+        if best != links[0]:
+            with self._lock:
+                self.redirects += 1
+        return best
+
+    def on_success(self, link: str) -> None:
+        with self._lock:
+            state = self._hosts.setdefault(self._host(link), MirrorState())
+            state.successes += 1
+            state.failures = 0
+            state.banned_until = 0.0
+
+    def on_failure(self, link: str) -> None:
+        with self._lock:
+            state = self._hosts.setdefault(self._host(link), MirrorState())
+            state.failures += 1
+            state.total_failures += 1
+            if state.failures >= self.failures_max and state.banned_until <= time.monotonic():
+                state.banned_until = time.monotonic() + MIRROR_BAN_SECONDS
+                # released host failing once again is banned again
+                state.failures = self.failures_max - 1
+                self.bans += 1
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return url_parse.urlparse(url).hostname or ''
+
+    def __str__(self) -> str:
+        return f'{self.bans:d} host ban(s), {self.redirects:d} file(s) sent to alternative host up front'
+
+#
+#
+#########################################
@@ -7,6 +7,8 @@ Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
 #
 
 import datetime
+import hashlib
+import json
 import os
 import pathlib
 import re
@@ -14,29 +16,63 @@ import sys
 import time
 from abc import ABC, abstractmethod
 from argparse import Namespace
-from multiprocessing.dummy import current_process
-from threading import Lock, Thread
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from multiprocessing.dummy import Pool, current_process
+from threading import BoundedSemaphore, Lock, Thread
 from urllib import parse as url_parse
 from warnings import filterwarnings
 
 from bs4 import BeautifulSoup
 from requests import Response, Session, adapters, exceptions, structures
 
+from .concurrency import AdaptiveConcurrency
 from .defines import (
+    BANDWIDTH_READ_SIZE_MIN,
     CONNECT_RETRIES_BASE,
-    CONNECT_RETRIES_CHUNK,
     CONNECT_TIMEOUT_BASE,
+    DISK_WRITER_QUEUE_SIZE,
+    DISK_WRITER_THREADS,
     DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_CHUNK_SIZE_MAX,
+    DOWNLOAD_CHUNK_SIZE_MIN,
+    HOST_CONNECTIONS,
+    HTML_CACHE_HOT_HITS,
+    HTML_CACHE_SIZE_DEFAULT,
+    HTTP_CACHE_TTL_MISSING,
+    HTTP_CACHE_TTLS,
     KNOWN_EXTENSIONS_VID,
+    PARTIAL_FILE_EXT,
+    PARTIAL_META_EXT,
+    TRANSFER_CHUNK_SECONDS,
+    TRANSFER_MIN_SPEED,
+    TRANSFER_READ_TIMEOUT_FACTOR,
+    TRANSFER_READ_TIMEOUT_MIN,
+    TRANSFER_STALL_WINDOW,
+    UTF8,
     WRITE_CHUNK_SIZE,
+    ConnectionPools,
     DownloadModes,
     HtmlCacheMode,
+    HttpCacheClass,
+    Mem,
     ThreadInterruptException,
 )
+from .hedge import Hedger
+from .httpcache import HttpCache
 from .logger import trace
+from .mirrors import MirrorHealth
 from .module import ProcModule
+from .pagecache import PageCache
+from .proxypool import ProxyPool
+from .ratelimit import RATE_LIMITS, RateLimiter, SharedRateLimiter, TokenBucket, TransferBudget
+from .retry import RetryPolicy
+from .singleflight import SingleFlight
+from .throughput import HostThroughput, TransferMeter
 from .useragent import UAManager
-from .utils import format_exception
+from .utils import file_md5, format_exception
+from .writer import DiskWriter, WriteTarget
 
 __all__ = ('DownloadInterruptException', 'ThreadedHtmlWorker', 'thread_exit')
 
@@ -45,18 +81,203 @@ filterwarnings('ignore', category=UserWarning)
 CLIENT_CONNECTOR_ERRORS = (exceptions.ProxyError, exceptions.SSLError)
 
 re_content_range_str = re.compile(r'bytes (\d+)-(\d+)?(?:/(\d+))?')
+re_vhost_cdn = re.compile(r'-cdn\d')  # video-cdn1.rs
 
 
 class DownloadInterruptException(BaseException):
     pass
 
 
+class ConnectionStats:
+    """Connections opened / requests sent, accumulated over all sessions of a worker"""
+    def __init__(self) -> None:
+        self._lock: Lock = Lock()
+        self.connections: int = 0
+        self.requests: int = 0
+
+    def on_connect(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def on_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def __str__(self) -> str:
+        reused = max(0, self.requests - self.connections)
+        return f'{self.requests:d} request(s), {self.connections:d} connection(s) opened, {reused:d} reused'
+
+    __repr__ = __str__
+
+
+class CountingHTTPAdapter(adapters.HTTPAdapter):
+    """HTTPAdapter reporting every connection handshake and every request sent to ConnectionStats"""
+    def __init__(self, stats: ConnectionStats, **kwargs) -> None:
+        self._stats = stats
+        self._pool_classes: dict[type, type] = {}
+        super().__init__(**kwargs)
+
+    def _counting_pool_class(self, pool_cls: type) -> type:
+        if pool_cls not in self._pool_classes:
+            stats = self._stats
+
+            class CountingConnection(pool_cls.ConnectionCls):
+                def connect(self) -> None:
+                    stats.on_connect()
+                    super().connect()
+
+            class CountingConnectionPool(pool_cls):
+                ConnectionCls = CountingConnection
+
+                def urlopen(self, *args, **kwargs):
+                    stats.on_request()
+                    return super().urlopen(*args, **kwargs)
+
+            self._pool_classes[pool_cls] = CountingConnectionPool
+        return self._pool_classes[pool_cls]
+
+    def _hook_manager(self, manager) -> None:
+        manager.pool_classes_by_scheme = {k: self._counting_pool_class(v) for k, v in manager.pool_classes_by_scheme.items()}
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self._hook_manager(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        is_new = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if is_new:
+            self._hook_manager(manager)
+        return manager
+
+
+class SessionPool:
+    """
+    SessionPool\n
+    Thread-safe pool of persistent sessions. A session is used by one thread at a time and then returned,
+    so established connections are reused across pages, files and tasks for the whole run
+    """
+    def __init__(self, factory: Callable[[], Session]) -> None:
+        self._factory = factory
+        self._lock: Lock = Lock()
+        self._idle: list[Session] = []
+        self._all: list[Session] = []
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        with self._lock:
+            ses = self._idle.pop() if self._idle else None
+        if ses is None:
+            ses = self._factory()
+            with self._lock:
+                self._all.append(ses)
+        try:
+            yield ses
+        finally:
+            with self._lock:
+                self._idle.append(ses)
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = list(self._all)
+            self._all.clear()
+            self._idle.clear()
+        [ses.close() for ses in sessions]
+
+
+class HostLimiter:
+    """Caps simultaneous requests per host"""
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._lock: Lock = Lock()
+        self._slots: dict[str, BoundedSemaphore] = {}
+
+    def _host_slots(self, url: str) -> BoundedSemaphore:
+        host = url_parse.urlparse(url).hostname or ''
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = BoundedSemaphore(self.limit)
+            return self._slots[host]
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        with self._host_slots(url):
+            yield
+
+    @contextmanager
+    def extra_slots(self, url: str, count: int) -> Iterator[int]:
+        """Takes up to 'count' slots without waiting, yields number of slots taken"""
+        host_slots = self._host_slots(url)
+        taken = 0
+        while taken < count and host_slots.acquire(blocking=False):
+            taken += 1
+        try:
+            yield taken
+        finally:
+            for _ in range(taken):
+                host_slots.release()
+
+
+class PartialFile:
+    """Resumable transfer state: '<name>.part' data file plus '<name>.part.meta' sidecar listing verified chunks"""
+    def __init__(self, dest: pathlib.Path) -> None:
+        self.part: pathlib.Path = dest.with_name(f'{dest.name}{PARTIAL_FILE_EXT}')
+        self.meta: pathlib.Path = dest.with_name(f'{dest.name}{PARTIAL_META_EXT}')
+        self.etag: str = ''
+        self.size: int = 0
+        self.chunk_size: int = 0
+        self.persistent: bool = False
+        self.done: set[int] = set()
+        self._lock: Lock = Lock()
+
+    def load(self, etag: str, size: int, chunk_size: int, chunks_count: int) -> int:
+        """Restores verified chunks if partial file belongs to the same remote file, returns number of bytes already done"""
+        self.etag, self.size, self.chunk_size = etag, size, chunk_size
+        self.persistent = chunks_count > 1
+        self.done.clear()
+        if self.persistent and self.part.is_file() and self.part.stat().st_size == size:
+            try:
+                with open(self.meta, 'rt', encoding=UTF8) as metafile:
+                    meta: dict = json.load(metafile)
+                if (meta['etag'], meta['size'], meta['chunk']) == (etag, size, chunk_size):
+                    self.done.update(int(c) for c in meta['done'] if 0 <= int(c) < chunks_count)
+            except (OSError, ValueError, TypeError, KeyError):
+                pass
+        return sum(min(chunk_size, size - c * chunk_size) for c in self.done)
+
+    def saved_chunk_size(self, etag: str, size: int) -> int:
+        """Chunk size of a resumable partial of the same remote file, 0 if there is none"""
+        try:
+            with open(self.meta, 'rt', encoding=UTF8) as metafile:
+                meta: dict = json.load(metafile)
+            return int(meta['chunk']) if (meta['etag'], meta['size']) == (etag, size) and self.part.is_file() else 0
+        except (OSError, ValueError, TypeError, KeyError):
+            return 0
+
+    def mark_done(self, chunk_num: int) -> None:
+        with self._lock:
+            self.done.add(chunk_num)
+            if self.persistent:
+                with open(self.meta, 'wt', encoding=UTF8) as metafile:
+                    json.dump({'etag': self.etag, 'size': self.size, 'chunk': self.chunk_size, 'done': sorted(self.done)}, metafile)
+
+    def complete(self, dest: pathlib.Path) -> None:
+        os.replace(self.part, dest)
+        self.meta.unlink(missing_ok=True)
+
+    def discard(self) -> None:
+        self.part.unlink(missing_ok=True)
+        self.meta.unlink(missing_ok=True)
+        self.done.clear()
+
+
 class FileDownloadResult:
     def __init__(self) -> None:
         self.file_size: int = 0
         self.expected_size: int = 0
         self.retries: int = 0
         self.result_str: str = ''
+        self.md5: str = ''
 
 
 def thread_exit(err_str='', code=-1) -> None:
@@ -94,17 +315,34 @@ class ThreadedHtmlWorker(ThreadedWorker):
     def __init__(self) -> None:
         super().__init__()
         self.verbose: bool = False
-        self.raw_html_cache: dict[str, BeautifulSoup | bytes] = {}
+        self.raw_html_cache: PageCache = PageCache(HTML_CACHE_SIZE_DEFAULT)
         self.cache_mode: HtmlCacheMode = HtmlCacheMode.CACHE_BYTES
         self.add_headers: structures.CaseInsensitiveDict[str, str] = structures.CaseInsensitiveDict()
         self.add_cookies: structures.CaseInsensitiveDict[str, str] = structures.CaseInsensitiveDict()
         self.ignore_proxy: bool = False
         self.ignore_proxy_dwn: bool = False
         self.proxies: dict[str, str] | None = None
+        self.proxy_pool: ProxyPool | None = None
         self.timeout: int = CONNECT_TIMEOUT_BASE
         self.retries: int = CONNECT_RETRIES_BASE
+        self.segments: int = 1
+        self.skip_head: bool = False
+        self.host_limiters: dict[int, HostLimiter] = {}
+        self.rate_limiter: RateLimiter | None = None
+        self.min_speed: int = TRANSFER_MIN_SPEED
+        self.host_throughput: HostThroughput = HostThroughput()
+        self.mirror_health: MirrorHealth = MirrorHealth(self.host_throughput)
+        self.hedger: Hedger | None = None
+        self.fetches: SingleFlight[bytes | None] = SingleFlight()
+        self.retry_policy: RetryPolicy = RetryPolicy()
+        self.bandwidth_limiter: TokenBucket | None = None
+        self.budget: TransferBudget = TransferBudget(0, 0)
         self.etags: dict[str, str] = {}
-        self.session: Session | None = None
+        self.http_cache: HttpCache | None = None
+        self.connection_stats: ConnectionStats = ConnectionStats()
+        self.html_sessions: SessionPool | None = None
+        self.disk_writer: DiskWriter = DiskWriter(DISK_WRITER_THREADS, DISK_WRITER_QUEUE_SIZE)
+        self.file_sessions: SessionPool | None = None
 
     @abstractmethod
     def _get_sitename(self) -> str:
@@ -118,28 +356,113 @@ class ThreadedHtmlWorker(ThreadedWorker):
     def _get_module_specific_default_cookies(self) -> dict[str, str]:
         ...
 
-    def make_session(self) -> Session:
+    def session_headers(self) -> dict[str, str]:
+        return {'Referer': self._get_sitename(), 'User-Agent': UAManager.orig_user_agent(), **self.add_headers}
+
+    def make_session(self, for_download=False) -> Session:
         s = Session()
         s.adapters.clear()
-        s.mount('http://', adapters.HTTPAdapter(pool_maxsize=1, max_retries=0))
-        s.mount('https://', adapters.HTTPAdapter(pool_maxsize=1, max_retries=0))
+        # every pooled session is used by a single thread at a time, one connection per host is enough
+        s.mount('http://', CountingHTTPAdapter(self.connection_stats, pool_maxsize=1, max_retries=0))
+        s.mount('https://', CountingHTTPAdapter(self.connection_stats, pool_maxsize=1, max_retries=0))
         s.keep_alive = True
-        s.headers['Referer'] = self._get_sitename()
-        s.headers['User-Agent'] = UAManager.orig_user_agent()
-        s.headers.update(self.add_headers.copy())
+        s.headers.update(self.session_headers())
         s.cookies.update(self.add_cookies.copy())
-        if self.proxies and not self.ignore_proxy:
+        if self.proxies and not self.ignore_proxy and not (for_download and self.ignore_proxy_dwn):
             s.proxies.update(self.proxies.copy())
+        if for_download:
+            s.stream = True
         return s
 
+    def make_session_pools(self) -> None:
+        self.close_session_pools()
+        self.html_sessions = SessionPool(self.make_session)
+        self.file_sessions = SessionPool(lambda: self.make_session(True))
+
+    def close_session_pools(self) -> None:
+        for pool in (self.html_sessions, self.file_sessions):
+            if pool:
+                pool.close()
+        self.html_sessions = self.file_sessions = None
+
+    def host_slot(self, url: str, pool=ConnectionPools.LISTING) -> AbstractContextManager[None]:
+        return self.host_limiters[pool].slot(url) if pool in self.host_limiters else nullcontext()
+
+    def extra_host_slots(self, url: str, pool: ConnectionPools, count: int) -> AbstractContextManager[int]:
+        return self.host_limiters[pool].extra_slots(url, count) if pool in self.host_limiters else nullcontext(count)
+
+    # threaded
+    def _wait_interruptible(self, wait_time: float) -> None:
+        while wait_time > 0.0:
+            self.catch_cancel_or_ctrl_c()
+            time.sleep(min(wait_time, 0.5))
+            wait_time -= 0.5
+
+    # threaded
+    def _wait_backoff(self, wait_time: float) -> None:
+        # unlike _wait_interruptible returns early instead of exiting so the caller can clean up
+        while wait_time > 0.0 and not self.is_killed():
+            time.sleep(min(wait_time, 0.5))
+            wait_time -= 0.5
+
+    # threaded
+    def throttle(self, url: str) -> None:
+        self._wait_interruptible(self.retry_policy.wait_time(url))
+        if self.rate_limiter:
+            self._wait_interruptible(self.rate_limiter.reserve(url))
+
+    # threaded
+    def _on_bytes_received(self, nbytes: int) -> None:
+        self.budget.consume(nbytes)
+        if self.bandwidth_limiter:
+            self._wait_interruptible(self.bandwidth_limiter.reserve(nbytes))
+
+    def _chunk_size(self, url: str) -> int:
+        """Range size taking about the same time to fetch regardless of host speed"""
+        if not (speed := self.host_throughput.speed(url)):
+            return DOWNLOAD_CHUNK_SIZE
+        chunk_size = int(speed * TRANSFER_CHUNK_SECONDS) // DOWNLOAD_CHUNK_SIZE_MIN * DOWNLOAD_CHUNK_SIZE_MIN
+        return min(DOWNLOAD_CHUNK_SIZE_MAX, max(DOWNLOAD_CHUNK_SIZE_MIN, chunk_size))
+
+    def _transfer_timeout(self, url: str) -> tuple[float, float]:
+        """Connect and read timeouts, read timeout is shortened for hosts known to be fast"""
+        if not (speed := self.host_throughput.speed(url)):
+            return float(self.timeout), float(self.timeout)
+        return float(self.timeout), min(float(self.timeout), max(TRANSFER_READ_TIMEOUT_MIN, TRANSFER_READ_TIMEOUT_FACTOR * self._read_size() / speed))
+
+    def _read_size(self) -> int:
+        # smaller reads keep a low speed limit smooth
+        if self.bandwidth_limiter:
+            return min(WRITE_CHUNK_SIZE, max(BANDWIDTH_READ_SIZE_MIN, int(self.bandwidth_limiter.rate) // 8))
+        # a read returns only once it is full, trickling connection must get through a few of them within stall window
+        if self.min_speed:
+            return min(WRITE_CHUNK_SIZE, max(BANDWIDTH_READ_SIZE_MIN, int(self.min_speed * TRANSFER_STALL_WINDOW) // 4))
+        return WRITE_CHUNK_SIZE
+
     def _parse_args(self, args: Namespace) -> None:
         self.verbose = args.verbose or self.verbose
         self.cache_mode = HtmlCacheMode.CACHE_BS if args.cache_html_bloat else HtmlCacheMode.CACHE_BYTES
+        self.raw_html_cache = PageCache(args.html_cache_size or HTML_CACHE_SIZE_DEFAULT, args.html_cache_compress,
+                                        0 if self.cache_mode == HtmlCacheMode.CACHE_BS else HTML_CACHE_HOT_HITS)
         self.ignore_proxy = args.noproxy or self.ignore_proxy
         self.ignore_proxy_dwn = args.proxynodown or self.ignore_proxy_dwn
         self.proxies = {'http': str(args.proxy), 'https': str(args.proxy)} if args.proxy else None
+        self.proxy_pool = ProxyPool(args.proxy_list) if args.proxy_list else None
         self.timeout = args.timeout or self.timeout
         self.retries = args.retries or self.retries
+        self.segments = args.segments or self.segments
+        self.skip_head = args.nohead or self.skip_head
+        self.min_speed = args.minspeed if args.minspeed is not None else self.min_speed
+        self.hedger = Hedger(self.catch_cancel_or_ctrl_c) if args.hedge else None
+        host_limits = args.host_conns or tuple(HOST_CONNECTIONS.values())
+        self.host_limiters = {pool: HostLimiter(limit) for pool, limit in zip(HOST_CONNECTIONS, host_limits, strict=True)}
+        rate_limit = args.ratelimit or RATE_LIMITS[ProcModule.value()]
+        self.rate_limiter = SharedRateLimiter(args.ratelimit_shared, *rate_limit) if args.ratelimit_shared else RateLimiter(*rate_limit)
+        self.bandwidth_limiter = TokenBucket(args.maxspeed, max(args.maxspeed, BANDWIDTH_READ_SIZE_MIN)) if args.maxspeed else None
+        self.budget = TransferBudget(args.budget or 0, (args.deadline or 0) * 60)
+        if args.http_cache:
+            ttls = args.http_cache_ttl or (*HTTP_CACHE_TTLS.values(), HTTP_CACHE_TTL_MISSING)
+            self.http_cache = HttpCache(args.http_cache, dict(zip(HTTP_CACHE_TTLS, ttls[:-1], strict=True)), ttls[-1])
         if args.headers:
             self.add_headers.update(args.headers)
         if args.cookies:
@@ -152,152 +475,276 @@ class ThreadedHtmlWorker(ThreadedWorker):
                 container_base[pair[0]] = pair[1]
         self.add_headers.update(self._get_module_specific_default_headers())
         self.add_cookies.update(self._get_module_specific_default_cookies())
-        self.session = self.make_session()
+        self.make_session_pools()
 
     # threaded
-    def download_file(self, link: str, item_id: str, dest: pathlib.Path, mode: DownloadModes, orig_date: bool) -> FileDownloadResult:
+    def download_file(self, link: str, item_id: str, dest: pathlib.Path, mode: DownloadModes, orig_date: bool,
+                      size_hint=0, md5='', tries=0) -> FileDownloadResult:
         fullname = dest.name
         ext_full = fullname[fullname.rfind('.') + 1:]
         ext_char = ext_full[0]
         is_video_ext = ext_full in KNOWN_EXTENSIONS_VID
         oldlink = link
+        mirror_links = self._mirror_links(link)
+        # known bad file host is skipped without wasting a try
+        link = self.mirror_health.pick(mirror_links)
 
         result = FileDownloadResult()
+        tries = tries or self.retries
         result.result_str = f'[{current_process().name}]{" <touch>" if mode == DownloadModes.TOUCH else ""} {item_id}({ext_char})... '
 
         if mode == DownloadModes.TOUCH:
             with open(dest, 'wb'):
                 pass
         elif mode == DownloadModes.FULL:
-            with self.make_session() as s:
-                s.stream = True
-                while (not (dest.is_file() and result.file_size == result.expected_size)) and result.retries < self.retries:
-                    if self.is_killed():
-                        trace(f'{result.result_str} interrupted', True)
-                        raise DownloadInterruptException
+            partial = PartialFile(dest)
+            retry_delay = 0.0
+            while (not (dest.is_file() and result.file_size == result.expected_size)) and result.retries < tries:
+                if self.is_killed():
+                    trace(f'{result.result_str} interrupted', True)
+                    raise DownloadInterruptException
+                probe: Response | None = None
+                # md5 of the contiguous verified prefix, computed while streaming
+                hasher = hashlib.md5()
+                hashed_size = 0
+                retry_wait = 0.0
+                # transfer occupies one host slot, extra segments take free ones only
+                with self.host_slot(link, ConnectionPools.FILE), self.file_sessions.session() as s:
                     try:
-                        def download_chunk(ofile, start: int, end: int, exp_size: int, chunk_num: int) -> None:
+                        def request_chunk(ses: Session, start: int, end: int, ranged: bool) -> Response:
                             headers = {'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
                                        'Accept-Language': 'en-US,en;q=0.5',
                                        'Accept-Encoding': 'gzip, deflate, br',
                                        'DNT': '1',
                                        # 'Host': reqhost,
                                        'Connection': 'keep-alive'}
-                            if not single_chunk:
+                            if ranged:
                                 headers['Range'] = f'bytes={start:d}-{end:d}'
                             headers.update(self.add_headers.copy())
-                            req = s.request('GET', link, timeout=self.timeout, stream=True, headers=headers, allow_redirects=False)
+                            return self.proxied_request(ses, 'GET', link, True, timeout=self._transfer_timeout(link), stream=True,
+                                                        headers=headers, allow_redirects=False)
+
+                        def download_chunk(ses: Session, sink: WriteTarget, start: int, end: int, exp_size: int, chunk_num: int) -> None:
+                            nonlocal probe, hasher, hashed_size
+                            if probe is not None and start == 0:
+                                # first chunk is already requested by probe
+                                req, probe = probe, None
+                            else:
+                                req = request_chunk(ses, start, end, not single_chunk)
                             req.raise_for_status()
-                            temp = b''
-                            for chunk_w in req.iter_content(WRITE_CHUNK_SIZE):
-                                temp += chunk_w
-                            req.close()
                             etag = req.headers.get('etag', item_id)
                             content_range = req.headers.get('content-range') if not single_chunk else None
                             content_range_m = re_content_range_str.search(content_range) if content_range else None
                             c_start = content_range_m.group(1) if content_range_m else '0'
                             c_end = content_range_m.group(2) if content_range_m else '0'
                             c_total = content_range_m.group(3) if content_range_m else '0'
-                            valid_chunk = True
                             errcode = 0
-                            if len(temp) != exp_size or (not single_chunk and int(c_total) != result.expected_size):
-                                valid_chunk = False
+                            # validate headers before consuming the body so a bad range costs nothing
+                            if not single_chunk and int(c_total) != result.expected_size:
                                 errcode = 1
                             elif etag != self.etags.get(item_id):
-                                valid_chunk = False
                                 errcode = 2
                             elif not single_chunk and not content_range:
-                                valid_chunk = False
                                 errcode = 3
                             elif not single_chunk and not content_range_m:
-                                valid_chunk = False
                                 errcode = 4
                             elif int(c_start) != start or (not single_chunk and int(c_end) != end):
-                                valid_chunk = False
                                 errcode = 5
-                            if valid_chunk is False:
+                            if errcode == 0:
+                                # pieces are handed to disk writer as they come, never holding the whole range in memory
+                                written = 0
+                                # hash is only extended by a chunk continuing the hashed prefix, failed chunk leaves it intact
+                                chunk_hasher = hasher.copy() if start == hashed_size else None
+                                # speed cap makes slow transfers intended
+                                meter = TransferMeter(self.min_speed, TRANSFER_STALL_WINDOW) if not self.bandwidth_limiter else None
+                                for chunk_w in req.iter_content(self._read_size()):
+                                    # only network reads are timed, waiting for disk writer is not a slow connection
+                                    with meter.excluded() if meter else nullcontext():
+                                        sink.write(start + written, chunk_w)
+                                        if chunk_hasher:
+                                            chunk_hasher.update(chunk_w)
+                                    written += len(chunk_w)
+                                    self._on_bytes_received(len(chunk_w))
+                                    if meter and meter.add(len(chunk_w)):
+                                        errcode = 7
+                                        break
+                                if meter and not errcode:
+                                    self.host_throughput.record(link, written, meter.elapsed())
+                                if errcode == 7:
+                                    trace(f'Warning (W2): {item_id} chunk {chunk_num:d} stalled below {self.min_speed / Mem.KB:.0f} Kb/s.'
+                                          f' Reconnecting...', True)
+                                    # drop the connection, range is requested again on a fresh one
+                                    ses.close()
+                                elif written != exp_size:
+                                    errcode = 6
+                                elif chunk_hasher:
+                                    hasher, hashed_size = chunk_hasher, hashed_size + written
+                            req.close()
+                            if errcode != 0:
+                                # range is not marked as verified so it will simply be rewritten
                                 trace(f'Warning (W2): {item_id} invalid chunk {chunk_num:d} err {errcode:d}', True)
                                 # website may send not an HTTP error but instead just a mismatched chunk and call it good
                                 severe_err = errcode in range(1, 4 + 1)
                                 response = Response()
                                 response.status_code = 416 if severe_err else 417  # Expectation Failed
                                 raise exceptions.HTTPError(response=response)
-                            ofile.write(temp)
 
-                        sreq = s.request('HEAD', link, timeout=self.timeout, allow_redirects=False, headers={'Bytes': str(10**12)})
-                        sreq.raise_for_status()
-                        last_modified = sreq.headers.get('last-modified', '') if orig_date else ''
+                        use_chunked = is_video_ext if ProcModule.is_rx() else True
+                        chunk_size_hint = self._chunk_size(link)
+                        # one token per transfer attempt, ranged continuation requests are not limited
+                        self.throttle(link)
+                        if self.skip_head or size_hint:
+                            # no HEAD: file info is taken from the first GET which also brings (at least) the first chunk
+                            probe = request_chunk(s, 0, chunk_size_hint - 1, use_chunked)
+                            probe.raise_for_status()
+                            file_headers = probe.headers
+                            if probe.status_code == 206:
+                                probe_range_m = re_content_range_str.search(file_headers.get('content-range', ''))
+                                result.expected_size = int(probe_range_m.group(3) or 0) if probe_range_m else 0
+                            else:
+                                # range is ignored, whole file is sent
+                                use_chunked = False
+                                result.expected_size = int(file_headers.get('content-length', '0'))
+                            if size_hint and result.expected_size != size_hint:
+                                trace(f'Warning (W1): {item_id} size {result.expected_size:d} differs from listed size {size_hint:d}', True)
+                        else:
+                            sreq = self.proxied_request(s, 'HEAD', link, True, timeout=self.timeout, stream=False,
+                                                        allow_redirects=False, headers={'Bytes': str(10**12)})
+                            sreq.raise_for_status()
+                            file_headers = sreq.headers
+                            result.expected_size = int(file_headers.get('content-length', '0'))
+                            sreq.close()
+                        last_modified = file_headers.get('last-modified', '') if orig_date else ''
                         modification_time_ns = (
                             int(datetime.datetime.strptime(last_modified, '%a, %d %b %Y %H:%M:%S %Z').timestamp() * 10 ** 9)
                             if last_modified else 0
                         )
-                        result.expected_size = int(sreq.headers.get('content-length', '0'))
-                        self.etags[item_id] = sreq.headers.get('etag', item_id)
+                        self.etags[item_id] = file_headers.get('etag', item_id)
                         # this code was left here after link replacements had been removed. DO NOT MOVE
                         # reqhost = re_link_host.search(link).group(1)
-                        sreq.close()
 
                         if result.expected_size == 0:
                             err_msg = f'Warning (W2): fetched {item_id}({ext_char}) file is empty.'
                             raise ValueError(err_msg)
 
-                        use_chunked = is_video_ext if ProcModule.is_rx() else True
-                        chunks = list(range(0, result.expected_size, DOWNLOAD_CHUNK_SIZE if use_chunked else result.expected_size))
-                        single_chunk = len(chunks) == 1
-                        with open(dest, 'wb') as outf:
-                            creation_time_ns = int(dest.stat().st_ctime_ns) if modification_time_ns else 0
-                            i = 0
-                            chunk_tries = 0
-                            while i < len(chunks):
-                                if self.is_killed():
-                                    raise ThreadInterruptException
+                        def download_chunks(ses: Session, sink: WriteTarget, chunk_nums: Iterable[int]) -> bool:
+                            for i in chunk_nums:
                                 chunk_begin = chunks[i]
                                 chunk_end = result.expected_size - 1 if i == len(chunks) - 1 else chunks[i + 1] - 1
                                 expected_chunk_size = (chunk_end - chunk_begin) + 1
+                                if self.is_killed():
+                                    raise ThreadInterruptException
                                 try:
-                                    download_chunk(outf, chunk_begin, chunk_end, expected_chunk_size, i + 1)
+                                    download_chunk(ses, sink, chunk_begin, chunk_end, expected_chunk_size, i + 1)
+                                    # chunk is marked as verified once it is actually written
+                                    sink.commit(lambda chunk_idx=i: partial.mark_done(chunk_idx))
+                                    self.retry_policy.on_success(link)
                                 except Exception as err:
                                     if isinstance(err, (KeyboardInterrupt, ThreadInterruptException)):
                                         raise
-                                    if chunk_tries >= CONNECT_RETRIES_CHUNK:
-                                        trace(f'Warning (W2): at {item_id} chunk {i + 1:d} catched too many HTTPError 416s!', True)
-                                        break
-                                    chunk_tries += 1
-                                    sleep_time = 2
+                                    if isinstance(err, exceptions.HTTPError) and err.response.status_code == 429:
+                                        AdaptiveConcurrency.report_overload()
+                                    self.retry_policy.on_failure(link, err)
+                                    # no waiting with the host slot taken: file try fails, verified chunks are resumed by the next one
                                     exc_p1, exc_p2 = tuple(str(sys.exc_info()[k]) for k in range(2))
-                                    trace(f'Warning (W2): at {item_id} chunk {i + 1:d} catched {exc_p1}: {exc_p2} retrying...', True)
-                                    if not self.is_killed():
-                                        time.sleep(sleep_time)
-                                    continue
-                                chunk_tries = 0
-                                i += 1
-
-                        result.file_size = dest.stat().st_size
+                                    trace(f'Warning (W2): at {item_id} chunk {i + 1:d} catched {exc_p1}: {exc_p2}', True)
+                                    return False
+                            return True
+
+                        def download_segment(segment_idx: int) -> bool:
+                            # every segment uses its own connection and file handle, ranges are written at their offsets
+                            with (AdaptiveConcurrency.joined(stage_slot),
+                                  self.file_sessions.session() as ss, open(partial.part, 'r+b') as sfile,
+                                  self.disk_writer.target(sfile) as ssink):
+                                while not segments_failed:
+                                    with segments_lock:
+                                        if not chunks_left:
+                                            return True
+                                        chunk_idx = chunks_left.popleft()
+                                    if not download_chunks(ss, ssink, (chunk_idx,)):
+                                        segments_failed.append(chunk_idx)
+                                return False
+
+                        # resumed file keeps chunk layout of its partial
+                        chunk_size = (partial.saved_chunk_size(self.etags[item_id], result.expected_size) or chunk_size_hint
+                                      if use_chunked else result.expected_size)
+                        if probe is not None and use_chunked and chunk_size != chunk_size_hint:
+                            probe.close()
+                            probe = None
+                        chunks = list(range(0, result.expected_size, chunk_size))
+                        single_chunk = len(chunks) == 1
+                        done_size = partial.load(self.etags[item_id], result.expected_size, chunk_size, len(chunks))
+                        if done_size:
+                            trace(f'{result.result_str}resuming at {done_size / Mem.MB:.2f} / {result.expected_size / Mem.MB:.2f} Mb', True)
+                        chunks_todo = [i for i in range(len(chunks)) if i not in partial.done]
+                        segments = min(self.segments, len(chunks_todo))
+                        # extra segments never wait for a host slot while this transfer holds one, busy host gets fewer segments
+                        with (open(partial.part, 'r+b' if done_size else 'wb') as outf,
+                              self.extra_host_slots(link, ConnectionPools.FILE, segments - 1) as extra_slots):
+                            creation_time_ns = int(partial.part.stat().st_ctime_ns) if modification_time_ns else 0
+                            if not done_size:
+                                outf.truncate(result.expected_size)
+                            segments = 1 + extra_slots
+                            if segments > 1:
+                                outf.close()
+                                chunks_left = deque(chunks_todo)
+                                segments_lock = Lock()
+                                segments_failed: list[int] = []
+                                # segment threads report overload for the slot of this transfer
+                                stage_slot = AdaptiveConcurrency.current_slot()
+                                with Pool(segments) as segments_pool:
+                                    segments_pool.map(download_segment, range(segments))
+                            else:
+                                with self.disk_writer.target(outf) as sink:
+                                    download_chunks(s, sink, chunks_todo)
+
+                        if len(partial.done) != len(chunks):
+                            trace(f'Warning (W3): {item_id} incomplete, {len(chunks) - len(partial.done):d} / {len(chunks):d} chunk(s) '
+                                  f'missing. Retrying file.', True)
+                            raise OSError
+                        result.file_size = partial.part.stat().st_size
                         if result.file_size != result.expected_size:
                             trace(f'Warning (W3): size mismatch for {item_id} ({result.file_size:d} / {result.expected_size:d}).'
                                   f' Retrying file.', True)
-                            dest.unlink(missing_ok=True)
+                            partial.discard()
                             result.file_size = 0
                             raise OSError
+                        if hashed_size == result.expected_size:
+                            result.md5 = hasher.hexdigest()
+                        elif md5:
+                            # resumed or segmented transfer, prefix hash is incomplete
+                            result.md5 = file_md5(partial.part)
+                        if md5 and result.md5 != md5:
+                            trace(f'Warning (W3): md5 mismatch for {item_id} ({result.md5} / {md5}). Retrying file.', True)
+                            partial.discard()
+                            result.file_size = 0
+                            result.md5 = ''
+                            raise OSError
+                        partial.complete(dest)
+                        self.mirror_health.on_success(link)
                         if creation_time_ns and modification_time_ns:
                             os.utime(dest, ns=(creation_time_ns, modification_time_ns))
                     except (KeyboardInterrupt, ThreadInterruptException):
-                        if dest.is_file():
-                            result.file_size = dest.stat().st_size
-                            if result.file_size != result.expected_size:
-                                dest.unlink()
-                                result.file_size = 0
+                        # verified chunks of a partial file are kept to be resumed by the next run
+                        if not partial.persistent:
+                            partial.discard()
+                        result.file_size = dest.stat().st_size if dest.is_file() else 0
                         trace(f'{result.result_str}{("interrupted by user." if current_process() == self.my_root_thread else "")}', True)
                         raise DownloadInterruptException
                     except Exception as err:
+                        if isinstance(err, exceptions.HTTPError) and err.response.status_code == 429:  # Too Many Requests
+                            AdaptiveConcurrency.report_overload()
+                        self.retry_policy.on_failure(link, err)
+                        # origin is the last resort and is never avoided, its 404 means the file is gone
+                        if link != mirror_links[-1] and self._is_mirror_failure(err):
+                            self.mirror_health.on_failure(link)
                         if isinstance(err, exceptions.HTTPError) and err.response.status_code == 404:  # RS cdn error
                             if ProcModule.is_rs():
                                 hostname: str = url_parse.urlparse(link).hostname or 'unk'
-                                if hostname.startswith('video') and '-cdn' in hostname:
+                                if link != mirror_links[-1]:
                                     trace(f'Warning (W3): {item_id} catched HTTPError 404 (host: {hostname})! '
                                           f'Trying no-cdn source...', True)
-                                    re_vhost_cdn = re.compile(r'-cdn\d')  # video-cdn1.rs
-                                    link = re_vhost_cdn.sub('', link)
+                                    link = mirror_links[-1]
                             elif ProcModule.is_rx():
                                 if link != oldlink:
                                     trace(f'Warning (W3): {item_id} catched HTTPError 404 for normalized link. '
@@ -306,40 +753,98 @@ class ThreadedHtmlWorker(ThreadedWorker):
                         if isinstance(err, exceptions.ConnectionError) and err.response is None:  # RS cdn error
                             if ProcModule.is_rs():
                                 hostname: str = url_parse.urlparse(link).hostname or 'unk'
-                                if hostname.startswith('video') and '-cdn' in hostname:
+                                if link != mirror_links[-1]:
                                     trace(f'Warning (W3): {item_id} catched ConnectionError (host: {hostname})! '
                                           f'Trying no-cdn source...', True)
-                                    re_vhost_cdn = re.compile(r'-cdn\d')  # video-cdn1.rs
-                                    link = re_vhost_cdn.sub('', link)
+                                    link = mirror_links[-1]
                         if isinstance(err, exceptions.HTTPError) and err.response.status_code == 416:  # Requested range is not satisfiable
                             trace(f'Warning (W3): {item_id} catched HTTPError 416!', True)
-                            dest.unlink(missing_ok=True)
+                            partial.discard()
                             result.file_size = 0
                         if not isinstance(err, CLIENT_CONNECTOR_ERRORS):
                             result.retries += 1
-                        trace(f'{result.result_str}{format_exception("row")} retry {result.retries:d}...', True)
-                        if not self.is_killed():
-                            time.sleep(2)
-                        continue
+                        if result.retries >= tries:
+                            trace(f'{result.result_str}{format_exception("row")}', True)
+                            continue
+                        retry_delay = self.retry_policy.backoff(retry_delay, err)
+                        trace(f'{result.result_str}{format_exception("row")} retry {result.retries:d} in {retry_delay:.1f} sec...', True)
+                        retry_wait = retry_delay
+                    finally:
+                        # probe response not consumed by the first chunk (failure or changed layout) holds a connection
+                        if probe is not None:
+                            probe.close()
+                # host slot is not held while waiting to retry
+                self._wait_backoff(retry_wait)
+            if not dest.is_file() and not partial.persistent:
+                partial.discard()
         return result
 
+    @staticmethod
+    def _mirror_links(link: str) -> list[str]:
+        """Link itself followed by alternative sources of the same file, the last one is the origin"""
+        if ProcModule.is_rs():
+            hostname = url_parse.urlparse(link).hostname or ''
+            if hostname.startswith('video') and '-cdn' in hostname:
+                return [link, re_vhost_cdn.sub('', link)]
+        return [link]
+
+    @staticmethod
+    def _is_mirror_failure(err: Exception) -> bool:
+        """Failure telling something about the file host rather than about the file"""
+        if isinstance(err, exceptions.HTTPError):
+            return err.response is not None and err.response.status_code == 404
+        return isinstance(err, (exceptions.ConnectionError, exceptions.Timeout)) and not isinstance(err, exceptions.ProxyError)
+
     # threaded
-    def wrap_request(self, url: str, tries: int, method: str, **kwargs) -> Response | None:
+    def proxied_request(self, ses: Session, method: str, url: str, for_download=False, **kwargs) -> Response:
+        """Sends request via a proxy picked from proxy pool (if any), outcome affects that proxy's score"""
+        if not self.proxy_pool or self.ignore_proxy or (for_download and self.ignore_proxy_dwn):
+            return ses.request(method, url, **kwargs)
+        proxy = self.proxy_pool.pick(for_download)
+        start = time.monotonic()
+        try:
+            r = ses.request(method, url, proxies={'http': proxy, 'https': proxy}, **kwargs)
+        except (exceptions.ConnectionError, exceptions.Timeout):
+            self.proxy_pool.report(proxy, False)
+            raise
+        # rejected by proxy itself or its address is throttled by site
+        self.proxy_pool.report(proxy, r.status_code not in (407, 429), time.monotonic() - start)
+        return r
+
+    # threaded
+    def _send_request(self, url: str, method: str, pool: ConnectionPools, **kwargs) -> Response:
+        def send() -> Response:
+            with self.host_slot(url, pool), self.html_sessions.session() as s:
+                s.cookies.update(self.add_cookies)
+                return self.proxied_request(s, method, url, timeout=self.timeout, stream=False, allow_redirects=True, **kwargs)
+
+        if not self.hedger or method != 'GET':
+            return send()
+        # duplicate request never waits for rate limiter
+        return self.hedger.run(url, send, lambda: not self.rate_limiter or self.rate_limiter.try_acquire(url))
+
+    # threaded
+    def wrap_request(self, url: str, tries: int, method: str, cache_missing=False, pool=ConnectionPools.LISTING, **kwargs,
+                     ) -> Response | None:
         r: Response | None = None
         retries = 0
+        sleep_time = 0.0
         while retries < tries:
             self.catch_cancel_or_ctrl_c()
             r = None
             try:
-                r = self.session.request(method, url, timeout=self.timeout, stream=False, allow_redirects=True, **kwargs)
+                self.throttle(url)
+                r = self._send_request(url, method, pool, **kwargs)
                 r.raise_for_status()
+                self.retry_policy.on_success(url)
                 break
             except (KeyboardInterrupt, ThreadInterruptException):
                 thread_exit('interrupted by user.', code=1)
             except Exception as err:
                 if not isinstance(err, CLIENT_CONNECTOR_ERRORS):
                     retries += 1
-                sleep_time = 1.0
+                self.retry_policy.on_failure(url, err)
+                sleep_time = self.retry_policy.backoff(sleep_time, err)
                 threadname = f'{current_process().name}: ' if current_process() != self.my_root_thread else ''
                 if isinstance(err, exceptions.HTTPError) and err.response.status_code == 404:
                     if r is not None and r.content and len(r.content.decode()) > 2:
@@ -347,16 +852,15 @@ class ThreadedHtmlWorker(ThreadedWorker):
                               f'\n{format_exception("row").strip()}.\nContinuing...', True)
                         break
                     trace(f'{threadname}catched err 404 {format_exception("row")}. Aborting...', True)
+                    if self.http_cache and cache_missing:
+                        self.http_cache.put_missing(url)
                     return None
                 elif isinstance(err, exceptions.HTTPError) and err.response.status_code == 429:  # Too Many Requests
-                    sleep_time += float(min(9, retries))
-                    trace(f'{threadname}catched {format_exception("row")}.'
-                          f'{f" Reconnecting in {sleep_time:.1f} sec... {retries:d}" if retries < tries else ""}', True)
-                else:
-                    trace(f'{threadname}catched {format_exception("row")}.'
-                          f'{f" Reconnecting in {sleep_time:.1f} sec... {retries:d}" if retries < tries else ""}', True)
-                if not self.is_killed():
-                    time.sleep(sleep_time)
+                    AdaptiveConcurrency.report_overload()
+                trace(f'{threadname}catched {format_exception("row")}.'
+                      f'{f" Reconnecting in {sleep_time:.1f} sec... {retries:d}" if retries < tries else ""}', True)
+                if retries < tries:
+                    self._wait_backoff(sleep_time)
                 continue
 
         if retries >= tries:
@@ -372,15 +876,42 @@ class ThreadedHtmlWorker(ThreadedWorker):
         return r
 
     # threaded
-    def fetch_html(self, url: str, tries=0, do_cache=False, method='GET', **kwargs) -> BeautifulSoup | None:
-        if cached := self.raw_html_cache.get(url, b''):
-            return cached if isinstance(cached, BeautifulSoup) else BeautifulSoup(cached, 'html.parser')
-        r = self.wrap_request(url, tries or self.retries, method, **kwargs)
-        result = BeautifulSoup(r.content, 'html.parser') if r is not None else None
+    def fetch_html(self, url: str, tries=0, do_cache=False, method='GET', req_class=HttpCacheClass.LISTING, **kwargs,
+                   ) -> BeautifulSoup | None:
+        if cached := self.raw_html_cache.get(url):
+            return cached
+        if method == 'GET' and not kwargs:
+            # concurrent callers share the request, each one gets its own tree since trees are not read-only
+            content = self.fetches.do(url, lambda: self._fetch_content(url, tries or self.retries, method, req_class))
+        else:
+            content = self._fetch_content(url, tries or self.retries, method, req_class, **kwargs)
+        result = BeautifulSoup(content, 'html.parser') if content is not None else None
         if result and do_cache:
-            self.raw_html_cache[url] = result if self.cache_mode == HtmlCacheMode.CACHE_BS else r.content
+            self.raw_html_cache.put(url, content, result)
         return result
 
+    # threaded
+    def _fetch_content(self, url: str, tries: int, method: str, req_class: HttpCacheClass, **kwargs) -> bytes | None:
+        pool = ConnectionPools.LISTING if req_class == HttpCacheClass.LISTING else ConnectionPools.ITEM
+        if not self.http_cache or method != 'GET' or kwargs:
+            r = self.wrap_request(url, tries, method, pool=pool, **kwargs)
+            return r.content if r is not None else None
+        entry = self.http_cache.get(url)
+        if entry and self.http_cache.is_fresh(entry, req_class):
+            if entry.status == 404:
+                trace(f'Cached 404 for {url}. Aborting...', True)
+                return None
+            return entry.body
+        r = self.wrap_request(url, tries, method, True, pool, headers=entry.validators() if entry else None)
+        if r is None:
+            return None
+        if r.status_code == 304 and entry:
+            self.http_cache.refresh(url, entry, r.headers.get('ETag', ''), r.headers.get('Last-Modified', ''))
+            return entry.body
+        if r.status_code == 200:
+            self.http_cache.put(url, 200, r.content, r.headers.get('ETag', ''), r.headers.get('Last-Modified', ''))
+        return r.content
+
 #
 #
 #########################################
@@ -0,0 +1,104 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import copy
+import zlib
+from collections import OrderedDict
+from threading import Lock
+
+from bs4 import BeautifulSoup
+
+from .defines import HTML_CACHE_HOT_HITS, HTML_CACHE_PARSED_SIZE_FACTOR, Mem
+
+__all__ = ('PageCache',)
+
+
+class PageCacheEntry:
+    __slots__ = ('data', 'hits', 'parsed', 'raw_size')
+
+    def __init__(self, data: bytes, raw_size: int) -> None:
+        self.data = data
+        self.raw_size = raw_size
+        self.parsed: BeautifulSoup | None = None
+        self.hits = 0
+
+    def size(self) -> int:
+        return len(self.data) + (self.raw_size * HTML_CACHE_PARSED_SIZE_FACTOR if self.parsed is not None else 0)
+
+
+class PageCache:
+    """LRU cache of fetched pages limited by total size, hot entries also keep their parsed tree to copy it for callers"""
+    def __init__(self, max_size: int, compress=False, hot_hits=HTML_CACHE_HOT_HITS) -> None:
+        self.max_size = max_size
+        self.compress = compress
+        self.hot_hits = hot_hits
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, PageCacheEntry] = OrderedDict()
+        self._lock: Lock = Lock()
+
+    def get(self, url: str) -> BeautifulSoup | None:
+        """Every caller gets a tree of its own, kept tree is only copied (cheaper than parsing) and never handed out"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.hits += 1
+            self._entries.move_to_end(url)
+            kept, data = entry.parsed, entry.data
+        if kept is not None:
+            return copy.copy(kept)
+        parsed = BeautifulSoup(zlib.decompress(data) if self.compress else data, 'html.parser')
+        if entry.hits >= self.hot_hits:
+            with self._lock:
+                promoted = self._entries.get(url) is entry and entry.parsed is None
+                if promoted:
+                    entry.parsed = parsed
+                    self.size += entry.size() - len(entry.data)
+                    self._evict()
+            if promoted:
+                return copy.copy(parsed)
+        return parsed
+
+    def put(self, url: str, content: bytes, parsed: BeautifulSoup | None = None) -> None:
+        entry = PageCacheEntry(zlib.compress(content, 1) if self.compress else content, len(content))
+        # caller keeps using its tree
+        entry.parsed = copy.copy(parsed) if parsed is not None and self.hot_hits == 0 else None
+        with self._lock:
+            if old_entry := self._entries.pop(url, None):
+                self.size -= old_entry.size()
+            self._entries[url] = entry
+            self.size += entry.size()
+            self._evict()
+
+    def _evict(self) -> None:
+        # newest entry is kept even if it alone exceeds the limit
+        while self.size > self.max_size and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.size -= entry.size()
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        return (f'{len(self._entries):d} page(s), {self.size / Mem.MB:.1f} / {self.max_size / Mem.MB:.1f} MB,'
+                f' {self.hits:d} hit(s), {self.misses:d} miss(es), {self.evictions:d} eviction(s)')
+
+#
+#
+#########################################
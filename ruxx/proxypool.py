@@ -0,0 +1,93 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import random
+import time
+from collections.abc import Iterable
+from threading import Lock
+
+from .defines import PROXY_FAILURES_MAX, PROXY_QUARANTINE_BASE, PROXY_QUARANTINE_MAX, ProxyUses
+
+__all__ = ('ProxyPool',)
+
+
+class ProxyState:
+    __slots__ = ('errors', 'failures', 'latency', 'quarantined_until', 'quarantines', 'requests', 'url', 'use')
+
+    def __init__(self, url: str, use: str) -> None:
+        self.url = url
+        self.use = use
+        self.latency = 0.0
+        self.errors = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+
+    def score(self) -> float:
+        """Lower is better, proxies never used come first"""
+        return (self.latency + 1.0) * (1.0 + 4.0 * self.errors)
+
+
+class ProxyPool:
+    """
+    Requests are spread across proxies preferring the faster and more reliable ones.
+    A proxy failing several times in a row is quarantined for a while, longer each time
+    """
+    def __init__(self, proxies: Iterable[tuple[str, str]], smoothing=0.3) -> None:
+        self.smoothing = smoothing
+        self.quarantines = 0
+        self._proxies: dict[str, ProxyState] = {}
+        self._lock: Lock = Lock()
+        for url, use in proxies:
+            # listed twice for different uses is the same as listed for all
+            self._proxies[url] = ProxyState(url, use if self._proxies.get(url, ProxyState(url, use)).use == use else ProxyUses.ALL)
+
+    def pick(self, for_download: bool) -> str:
+        use = ProxyUses.FILES if for_download else ProxyUses.PAGES
+        now = time.monotonic()
+        with self._lock:
+            candidates = [p for p in self._proxies.values() if p.use in (use, ProxyUses.ALL)] or list(self._proxies.values())
+            healthy = [p for p in candidates if p.quarantined_until <= now]
+            if not healthy:
+                # never fall back to direct connection, the one released soonest is the least bad
+                return min(candidates, key=lambda p: p.quarantined_until).url
+            # best of two random choices spreads load while still avoiding slow proxies
+            return min(random.sample(healthy, min(2, len(healthy))), key=ProxyState.score).url
+
+    def report(self, url: str, ok: bool, latency=0.0) -> None:
+        with self._lock:
+            if (proxy := self._proxies.get(url)) is None:
+                return
+            proxy.requests += 1
+            proxy.errors += ((0.0 if ok else 1.0) - proxy.errors) * self.smoothing
+            if ok:
+                proxy.latency = latency if proxy.requests == 1 else proxy.latency + (latency - proxy.latency) * self.smoothing
+                proxy.failures = proxy.quarantines = 0
+                return
+            proxy.failures += 1
+            now = time.monotonic()
+            if proxy.failures >= PROXY_FAILURES_MAX and proxy.quarantined_until <= now:
+                # released proxy failing once again goes straight back
+                proxy.quarantined_until = now + min(PROXY_QUARANTINE_MAX, PROXY_QUARANTINE_BASE * 2 ** proxy.quarantines)
+                proxy.quarantines += 1
+                proxy.failures = PROXY_FAILURES_MAX - 1
+                self.quarantines += 1
+
+    def __len__(self) -> int:
+        return len(self._proxies)
+
+    def __str__(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            quarantined = sum(p.quarantined_until > now for p in self._proxies.values())
+        return f'{len(self._proxies):d} proxies, {quarantined:d} quarantined now, {self.quarantines:d} quarantine(s) total'
+
+#
+#
+#########################################
@@ -0,0 +1,192 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import errno
+import pathlib
+import struct
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from threading import Lock
+from typing import BinaryIO
+from urllib import parse as url_parse
+
+from .defines import PLATFORM_WINDOWS
+from .module import ProcModule
+
+if sys.platform == PLATFORM_WINDOWS:
+    import msvcrt
+else:
+    import fcntl
+
+__all__ = ('RATE_LIMITS', 'RateLimiter', 'SharedRateLimiter', 'TokenBucket', 'TransferBudget')
+
+# requests per second, burst (0 rate is unlimited)
+RATE_LIMITS: dict[int, tuple[float, int]] = {
+    ProcModule.RX: (0.0, 0),
+    ProcModule.RN: (0.0, 0),
+    ProcModule.RS: (0.0, 0),
+    ProcModule.RP: (2.0, 2),
+    ProcModule.EN: (2.0, 2),
+    ProcModule.XB: (4.0, 4),
+    ProcModule.BB: (4.0, 4),
+}
+
+
+class TokenBucket:
+    """Refills 'rate' tokens per second up to 'burst' tokens, tokens are taken in advance and waited for by the taker"""
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._lock: Lock = Lock()
+
+    def reserve(self, tokens=1.0) -> float:
+        """Takes tokens and returns number of seconds to wait until they are actually available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0.0 else 0.0
+
+    def try_take(self, tokens=1.0) -> bool:
+        """Takes tokens only if they are available right now"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+
+class RateLimiter:
+    """Token buckets keyed by host, all sharing the same rate and burst"""
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._lock: Lock = Lock()
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def reserve(self, url: str) -> float:
+        if self.rate <= 0.0:
+            return 0.0
+        host = url_parse.urlparse(url).hostname or ''
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            bucket = self._buckets[host]
+        return bucket.reserve()
+
+    def try_acquire(self, url: str) -> bool:
+        if self.rate <= 0.0:
+            return True
+        host = url_parse.urlparse(url).hostname or ''
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            bucket = self._buckets[host]
+        return bucket.try_take()
+
+    def __str__(self) -> str:
+        return f'{self.rate:.2f} req/s, burst {self.burst:d}' if self.rate > 0.0 else 'unlimited'
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    Same limits shared by all processes using the same folder:
+    every host bucket is a small file holding tokens and timestamp, updated under file lock
+    """
+    BUCKET_FORMAT = '<dd'
+
+    def __init__(self, path: pathlib.Path, rate: float, burst: int) -> None:
+        super().__init__(rate, burst)
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    @contextmanager
+    def _locked(bfile: BinaryIO) -> Iterator[None]:
+        if sys.platform == PLATFORM_WINDOWS:
+            while True:
+                try:
+                    bfile.seek(0)
+                    msvcrt.locking(bfile.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError as err:
+                    # LK_LOCK gives up after 10 attempts a second apart, a busy bucket is not a failed request
+                    if err.errno != errno.EDEADLOCK:
+                        raise
+            try:
+                yield
+            finally:
+                bfile.seek(0)
+                msvcrt.locking(bfile.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(bfile.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(bfile.fileno(), fcntl.LOCK_UN)
+
+    def _take(self, url: str, tokens: float, wait: bool) -> float:
+        """Seconds to wait until tokens are available, -1 if 'wait' is False and they are not available right now"""
+        bucket_path = self.path / f'{url_parse.urlparse(url).hostname or "_"}.bucket'
+        with open(bucket_path, 'a+b') as bfile, self._locked(bfile):
+            bfile.seek(0)
+            data = bfile.read(struct.calcsize(self.BUCKET_FORMAT))
+            # wall clock is the only one shared between processes, it may also go backwards
+            now = time.time()
+            new_bucket = len(data) != struct.calcsize(self.BUCKET_FORMAT)
+            stored_tokens, stamp = (float(self.burst), now) if new_bucket else struct.unpack(self.BUCKET_FORMAT, data)
+            stored_tokens = min(float(self.burst), stored_tokens + max(0.0, now - stamp) * self.rate)
+            if not wait and stored_tokens < tokens:
+                return -1.0
+            stored_tokens -= tokens
+            bfile.seek(0)
+            bfile.truncate()
+            bfile.write(struct.pack(self.BUCKET_FORMAT, stored_tokens, now))
+        return -stored_tokens / self.rate if stored_tokens < 0.0 else 0.0
+
+    def reserve(self, url: str) -> float:
+        return self._take(url, 1.0, True) if self.rate > 0.0 else 0.0
+
+    def try_acquire(self, url: str) -> bool:
+        return self._take(url, 1.0, False) >= 0.0 if self.rate > 0.0 else True
+
+    def __str__(self) -> str:
+        return f'{super().__str__()}, shared via \'{self.path.as_posix()}\''
+
+
+class TransferBudget:
+    """Total downloaded bytes and / or run time limit, 0 is unlimited"""
+    def __init__(self, max_bytes: int, max_seconds: float) -> None:
+        self.max_bytes = max_bytes
+        self.deadline = time.monotonic() + max_seconds if max_seconds else 0.0
+        self.bytes_done = 0
+        self._lock: Lock = Lock()
+
+    def consume(self, nbytes: int) -> None:
+        with self._lock:
+            self.bytes_done += nbytes
+
+    def exhausted(self) -> str:
+        """Returns the reason if budget is exhausted, empty string otherwise"""
+        if self.max_bytes and self.bytes_done >= self.max_bytes:
+            return f'Download budget of {self.max_bytes:d} bytes is exhausted'
+        if self.deadline and time.monotonic() >= self.deadline:
+            return 'Download deadline is reached'
+        return ''
+
+#
+#
+#########################################
@@ -0,0 +1,121 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from urllib import parse as url_parse
+
+from requests import Response, exceptions
+
+from .defines import (
+    CIRCUIT_COOLDOWN_BASE,
+    CIRCUIT_COOLDOWN_MAX,
+    CIRCUIT_FAILURES_MAX,
+    RETRY_AFTER_MAX,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_CAP,
+)
+
+__all__ = ('RetryPolicy',)
+
+# statuses meaning the host is (temporarily) unable to serve, not that the request is wrong
+RETRY_OVERLOAD_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HostCircuit:
+    __slots__ = ('failures', 'open_until', 'opens')
+
+    def __init__(self) -> None:
+        self.failures = 0
+        self.opens = 0
+        self.open_until = 0.0
+
+
+class RetryPolicy:
+    """
+    Shared by page and file requests:
+    retry delays grow exponentially with decorrelated jitter, server's Retry-After takes precedence.
+    A host failing too many times in a row is closed for everyone for a while (circuit breaker)
+    """
+    def __init__(self, base=RETRY_BACKOFF_BASE, cap=RETRY_BACKOFF_CAP, failures_max=CIRCUIT_FAILURES_MAX) -> None:
+        self.base = base
+        self.cap = cap
+        self.failures_max = failures_max
+        self.trips = 0
+        self._circuits: dict[str, HostCircuit] = {}
+        self._lock: Lock = Lock()
+
+    @staticmethod
+    def retry_after(response: Response | None) -> float:
+        """Seconds requested by server via Retry-After header, 0 if none"""
+        value = response.headers.get('Retry-After', '') if response is not None else ''
+        try:
+            return min(RETRY_AFTER_MAX, max(0.0, float(value)))
+        except ValueError:
+            try:
+                return min(RETRY_AFTER_MAX, max(0.0, parsedate_to_datetime(value).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                return 0.0
+
+    @staticmethod
+    def is_overload(err: Exception) -> bool:
+        if isinstance(err, exceptions.HTTPError):
+            return err.response is not None and err.response.status_code in RETRY_OVERLOAD_STATUSES
+        # failing proxy says nothing about the host
+        return isinstance(err, (exceptions.ConnectionError, exceptions.Timeout)) and not isinstance(err, exceptions.ProxyError)
+
+    def backoff(self, prev_delay: float, err: Exception | None = None) -> float:
+        """Delay before the next try, 'prev_delay' is the previous delay returned for the same request (0 for the first retry)"""
+        response = err.response if isinstance(err, exceptions.RequestException) else None
+        if retry_after := self.retry_after(response):
+            return retry_after
+        return min(self.cap, random.uniform(self.base, max(self.base, prev_delay * 3)))
+
+    def wait_time(self, url: str) -> float:
+        """Seconds until the host is open again"""
+        with self._lock:
+            circuit = self._circuits.get(self._host(url))
+            return max(0.0, circuit.open_until - time.monotonic()) if circuit else 0.0
+
+    def on_success(self, url: str) -> None:
+        with self._lock:
+            if circuit := self._circuits.get(self._host(url)):
+                circuit.failures = circuit.opens = 0
+
+    def on_failure(self, url: str, err: Exception) -> None:
+        if not self.is_overload(err):
+            return
+        response = err.response if isinstance(err, exceptions.RequestException) else None
+        retry_after = self.retry_after(response)
+        with self._lock:
+            circuit = self._circuits.setdefault(self._host(url), HostCircuit())
+            circuit.failures += 1
+            now = time.monotonic()
+            if retry_after:
+                # server told everyone to wait
+                circuit.open_until = max(circuit.open_until, now + retry_after)
+            if circuit.failures >= self.failures_max and circuit.open_until <= now:
+                # half-open after cooldown: next failure re-opens for longer
+                cooldown = min(CIRCUIT_COOLDOWN_MAX, CIRCUIT_COOLDOWN_BASE * 2 ** circuit.opens)
+                circuit.open_until = now + cooldown
+                circuit.opens += 1
+                circuit.failures = self.failures_max - 1
+                self.trips += 1
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return url_parse.urlparse(url).hostname or ''
+
+    def __str__(self) -> str:
+        return f'{self.trips:d} host circuit trip(s)'
+
+#
+#
+#########################################
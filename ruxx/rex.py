@@ -86,6 +86,10 @@ re_tags_exclude_bb = re_tags_exclude_rx
 
 re_item_info_part_xml = re.compile(r'([\w5_]+=\"[^"]+\")[> ]')
 re_orig_file_link = re.compile(r'file_url=\"([^"]+)\"')
+re_file_size = re.compile(r' file_size=\"(\d+)\"')
+re_item_width = re.compile(r' width=\"(\d+)\"')
+re_item_height = re.compile(r' height=\"(\d+)\"')
+re_file_md5 = re.compile(r' md5=\"([0-9a-f]{32})\"')
 re_sample_file_link = re.compile(r'file_url=\"([^"]+)\"')
 re_item_filename = re.compile(r'file_name=\"([^"]+)\"')
 re_post_page_rx = re.compile(r'^(?:\?page=post&(?:amp;)?s=list|document\.location=\'\?page=favorites|\?page=pool&(?:amp;)?s=show)&.+?$')
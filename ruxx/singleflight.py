@@ -0,0 +1,64 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+from collections.abc import Callable, Hashable
+from threading import Event, Lock
+from typing import Generic, TypeVar
+
+__all__ = ('SingleFlight',)
+
+RT = TypeVar('RT')
+
+
+class Flight(Generic[RT]):
+    __slots__ = ('done', 'error', 'result')
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.result: RT | None = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight(Generic[RT]):
+    """Concurrent calls with the same key share a single call in progress and its result (or exception)"""
+    def __init__(self) -> None:
+        self.calls = 0
+        self.shared = 0
+        self._flights: dict[Hashable, Flight[RT]] = {}
+        self._lock: Lock = Lock()
+
+    def do(self, key: Hashable, func: Callable[[], RT]) -> RT:
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            if leader := flight is None:
+                flight = self._flights[key] = Flight()
+            else:
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as err:
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def __str__(self) -> str:
+        return f'{self.shared:d} of {self.calls:d} request(s) joined one in progress'
+
+#
+#
+#########################################
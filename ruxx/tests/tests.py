@@ -6,28 +6,82 @@ Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
 #
 #
 
+from __future__ import annotations
+
 import functools
+import hashlib
+import io
 import json
 import pathlib
+import re
+import tarfile
+import time
+import zipfile
+from argparse import ArgumentError
 from collections.abc import Callable
 from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from tempfile import TemporaryDirectory
+from threading import Event, Lock, Thread
 from unittest import TestCase
+from unittest.mock import patch
+
+from bs4 import BeautifulSoup
+from requests import Response, Session, exceptions
 
+from ruxx.archive import ArchiveSink
 from ruxx.cmdargs import prepare_arglist
-from ruxx.defines import DATE_MIN_DEFAULT, MODULE_CHOICES, Comment, DownloadModes, ItemInfo, ThreadInterruptException
+from ruxx.concurrency import AdaptiveConcurrency
+from ruxx.defines import (
+    ARCHIVE_FORMATS,
+    CIRCUIT_COOLDOWN_BASE,
+    DATE_MIN_DEFAULT,
+    DMODE_CHOICES,
+    DOWNLOAD_CHUNK_SIZE,
+    MIRROR_FAILURES_MAX,
+    MIRROR_MIN_SAMPLES,
+    MODULE_CHOICES,
+    PROXY_FAILURES_MAX,
+    RETRY_AFTER_MAX,
+    SCHEDULE_IMAGE_BYTES_PER_PIXEL,
+    SCHEDULE_IMAGE_SIZE_DEFAULT,
+    UTF8,
+    ArchiveFormats,
+    Comment,
+    ConnectionPools,
+    DownloadModes,
+    ItemInfo,
+    Mem,
+    ProxyUses,
+    ScheduleModes,
+    ThreadInterruptException,
+)
 from ruxx.downloaders import DOWNLOADERS_BY_PROC_MODULE, make_downloader
 from ruxx.file_parser import IDSTRING_PATTERNS, IDVAL_EQ_SEPARATORS, PREFIX_OPTIONAL_PATTERNS
 from ruxx.gui import ICON_TYPE_PER_PROC_MODULE
 from ruxx.gui_base import HELP_TAGS_PER_PROC_MODULE, SITENAMES_PER_PROC_MODULE
+from ruxx.gui_defines import OPTION_CMD_DOWNMODE
+from ruxx.hedge import Hedger
+from ruxx.httpcache import HttpCache
 from ruxx.logger import Logger
+from ruxx.manifest import ManifestWriter
+from ruxx.mirrors import MirrorHealth
 from ruxx.module import ProcModule
+from ruxx.network import HostLimiter, PartialFile, SessionPool
+from ruxx.pagecache import PageCache
+from ruxx.proxypool import ProxyPool
+from ruxx.ratelimit import RATE_LIMITS, RateLimiter, SharedRateLimiter, TokenBucket, TransferBudget
+from ruxx.retry import RetryPolicy
 from ruxx.rex import re_infolist_filename
+from ruxx.singleflight import SingleFlight
 from ruxx.tags_parser import RE_ANDGR_FULL, RE_FAVS, RE_METAS, RE_ORGRS_FULL, RE_ORGRS_FULL_S, RE_PLAINS, RE_POOLS, RE_SORTS, parse_tags
 from ruxx.tagsdb import TAG_ALIASES, TagsDB, load_tag_aliases
 from ruxx.task import MAX_NEGATIVE_TAGS, MAX_STRING_LENGTHS, MAX_WILDCARDS
+from ruxx.throughput import HostThroughput
 from ruxx.useragent import UAManager
+from ruxx.validators import valid_byte_size, valid_min_speed, valid_proxy_list
 from ruxx.vcs.version import APP_NAME
+from ruxx.writer import DiskWriter
 
 __all__ = ()
 
@@ -36,6 +90,8 @@ RUN_CONN_TESTS = 0
 CUR_PATH = pathlib.Path(__file__).resolve().parent.as_posix()
 
 DEFAULT_HEADERS = UAManager.orig_user_agent_as_header_json_str()
+# validators raise ArgumentError class without arguments, which turns into TypeError, argparse handles both
+VALIDATOR_ERRORS = (ArgumentError, TypeError)
 
 args_argparse_str01 = (
     'sfw asd ned -nds -proxr '
@@ -67,6 +123,12 @@ args_argparse_str12_1 = args_argparse_str12_base + ' order=id_desc'
 args_argparse_str12_2 = args_argparse_str12_base + ' order=id_asc'
 args_argparse_str13_1 = args_argparse_str12_base + ' order:id'
 args_argparse_str13_2 = args_argparse_str12_base + ' order:score'
+args_argparse_str14_segments = 'sfw -segments 4 -nohead'
+args_argparse_str15_conns = 'sfw -threads 8 -host_conns 2,4,32'
+args_argparse_str16_ratelimit = 'sfw -ratelimit 2.5,4'
+args_argparse_str17_speed = 'sfw -maxspeed 1.5M -minspeed 0'
+args_argparse_str18_schedule = 'sfw -schedule large'
+args_argparse_str19_http_cache = 'sfw -http_cache_ttl 5,60,30'
 args_tagparse_str1 = (
     'sfw asd ned -nds -proxr sort:id sord:score:asc -rating:explicit score:90 '
     '(t1~t2~t3) (t4~t5) -(t6,t7) -(t8,t9,t10) -(t?1,t*2|t?3|t11,t12*,*t13)'
@@ -125,6 +187,87 @@ def test_prepare(*, log_disable=True, log_cmd=True) -> Callable[[], Callable[[],
     return invoke1
 
 
+class FileRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: FileServer
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self._respond(False)
+
+    def do_GET(self) -> None:
+        self._respond(True)
+
+    def _respond(self, send_body: bool) -> None:
+        range_str = self.headers.get('Range', '')
+        self.server.requests.append((self.command, self.path, range_str))
+        data = self.server.files.get(self.path)
+        if (self.path, range_str) in self.server.fail_once:
+            self.server.fail_once.remove((self.path, range_str))
+            data = None
+        if data is None:
+            self.send_response(404 if self.path not in self.server.files else 500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if (range_m := re.fullmatch(r'bytes=(\d+)-(\d+)', range_str)) and self.server.ranges:
+            start, end = int(range_m.group(1)), min(int(range_m.group(2)), len(data) - 1)
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start:d}-{end:d}/{len(data):d}')
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', f'"{self.path}"')
+        self.end_headers()
+        if send_body and self.path in self.server.slow_once:
+            self.server.slow_once.remove(self.path)
+            try:
+                for i in range(0, len(body), 1024):
+                    self.wfile.write(body[i:i + 1024])
+                    time.sleep(0.01)
+            except OSError:
+                pass
+        elif send_body:
+            self.wfile.write(body)
+
+
+class FileServer(ThreadingHTTPServer):
+    """Local file host for offline download tests: HEAD and single range GET (unless disabled), every request is recorded"""
+    daemon_threads = True
+
+    def __init__(self, files: dict[str, bytes]) -> None:
+        super().__init__(('127.0.0.1', 0), FileRequestHandler)
+        self.files = files
+        self.requests: list[tuple[str, str, str]] = []
+        self.ranges = True
+        # (path, range) answered with error once
+        self.fail_once: set[tuple[str, str]] = set()
+        # paths sent at about 100 Kb/s once
+        self.slow_once: set[str] = set()
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]:d}{path}'
+
+    def gets(self, path: str) -> list[str]:
+        """Ranges requested by GETs of path"""
+        return [range_str for method, rpath, range_str in self.requests if method == 'GET' and rpath == path]
+
+    def heads(self, path: str) -> int:
+        return sum(method == 'HEAD' and rpath == path for method, rpath, _ in self.requests)
+
+    def __enter__(self) -> FileServer:
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        super().__exit__(*args)
+
+
 class DataStructureIntegrityTests(TestCase):
     @test_prepare()
     def test_integrity01_iteminfo(self) -> None:
@@ -189,6 +332,8 @@ class DataStructureIntegrityTests(TestCase):
         self.assertEqual(ProcModule.PROC_MODULE_MAX, len(ICON_TYPE_PER_PROC_MODULE))
         self.assertEqual(ProcModule.PROC_MODULE_MAX, len(SITENAMES_PER_PROC_MODULE))
         self.assertEqual(ProcModule.PROC_MODULE_MAX, len(HELP_TAGS_PER_PROC_MODULE))
+        self.assertEqual(ProcModule.PROC_MODULE_MAX, len(RATE_LIMITS))
+        self.assertEqual(('', *DMODE_CHOICES[1:]), OPTION_CMD_DOWNMODE)
         print(f'{self._testMethodName} passed')
 
 
@@ -244,6 +389,45 @@ class ArgParseTests(TestCase):
         self.assertIsNotNone(arglist.api_key)
         print(f'{self._testMethodName} passed')
 
+    @test_prepare()
+    def test_argparse03_segments(self) -> None:
+        arglist = prepare_arglist(args_argparse_str14_segments.split())
+        self.assertEqual(4, arglist.segments)
+        self.assertTrue(arglist.nohead)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_argparse04_conns(self) -> None:
+        arglist = prepare_arglist(args_argparse_str15_conns.split())
+        self.assertEqual(8, arglist.threads)
+        self.assertEqual((2, 4, 32), arglist.host_conns)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_argparse05_ratelimit(self) -> None:
+        arglist = prepare_arglist(args_argparse_str16_ratelimit.split())
+        self.assertEqual((2.5, 4), arglist.ratelimit)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_argparse06_speed(self) -> None:
+        arglist = prepare_arglist(args_argparse_str17_speed.split())
+        self.assertEqual(1572864, arglist.maxspeed)
+        self.assertEqual(0, arglist.minspeed)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_argparse07_schedule(self) -> None:
+        arglist = prepare_arglist(args_argparse_str18_schedule.split())
+        self.assertEqual('large', arglist.schedule)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_argparse08_http_cache(self) -> None:
+        arglist = prepare_arglist(args_argparse_str19_http_cache.split())
+        self.assertEqual((300, 3600, 1800, 86400), arglist.http_cache_ttl)
+        print(f'{self._testMethodName} passed')
+
 
 class TagParseTests(TestCase):
     @test_prepare()
@@ -274,6 +458,24 @@ class DownloaderBaseTests(TestCase):
             self.assertEqual('06-05-2023', dwn._extract_post_date(item_str01_rx))
         print(f'{self._testMethodName} passed')
 
+    @test_prepare()
+    def test_item02_rx_md5(self) -> None:
+        args = args_argparse_str01
+        arglist = prepare_arglist(args.split())
+        with make_downloader(ProcModule.RX) as dwn:
+            dwn._parse_args(arglist)
+            file_url = dwn.extract_file_url(item_str01_rx)[0]
+            sample_url = re.search(r'sample_url="([^"]+)"', item_str01_rx).group(1)
+            self.assertNotEqual(file_url, sample_url)
+            sent: list[tuple[str, str]] = []
+            dwn._download = lambda link, item_id, dest, size_hint=0, md5='': sent.append((link, md5))
+            # listed md5 is only checked for the original file
+            for address in (file_url, sample_url):
+                dwn._get_image_address = lambda _h, addr=address: (addr, 'jpeg')
+                dwn._send_to_download(item_str01_rx, '7869261', False)
+            self.assertEqual([(file_url, '76dfed93372eb7a373ffe2430379cfb1'), (sample_url, '')], sent)
+        print(f'{self._testMethodName} passed')
+
     @test_prepare()
     def test_item01_rn(self) -> None:
         args = args_argparse_str01
@@ -483,6 +685,887 @@ class DownloaderBaseTests(TestCase):
             self.assertFalse(dwn.default_sort)
         print(f'{self._testMethodName} passed')
 
+    @test_prepare()
+    def test_cmdline14_conns(self) -> None:
+        args = args_argparse_str15_conns
+        arglist = prepare_arglist(args.split())
+        with make_downloader(ProcModule.RX) as dwn:
+            dwn._parse_args(arglist)
+            self.assertEqual((4, 8, 8), (dwn.maxthreads_pages, dwn.maxthreads_info, dwn.maxthreads_files))
+            self.assertEqual({ConnectionPools.LISTING: 2, ConnectionPools.ITEM: 4, ConnectionPools.FILE: 32},
+                             {pool: limiter.limit for pool, limiter in dwn.host_limiters.items()})
+            # starts at half the threads, within the host connection pool limit
+            self.assertEqual((2, 4), (int(dwn.page_concurrency.limit), int(dwn.item_concurrency.limit)))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_cmdline15_speed(self) -> None:
+        args = args_argparse_str17_speed
+        arglist = prepare_arglist(args.split())
+        with make_downloader(ProcModule.RX) as dwn:
+            dwn._parse_args(arglist)
+            self.assertEqual(0, dwn.min_speed)
+            self.assertEqual(1572864, dwn.bandwidth_limiter.rate)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_schedule01_estimate(self) -> None:
+        arglist = prepare_arglist(args_argparse_str18_schedule.split())
+        with make_downloader(ProcModule.RX) as dwn:
+            dwn._parse_args(arglist)
+            self.assertEqual(ScheduleModes.LARGE_FIRST, dwn.schedule)
+            # listed size is preferred over resolution estimate
+            self.assertEqual(int(961 * 1291 * SCHEDULE_IMAGE_BYTES_PER_PIXEL), dwn._estimate_item_size(item_str01_rx))
+            self.assertEqual(12345, dwn._estimate_item_size(f'{item_str01_rx} file_size="12345"'))
+            self.assertEqual(SCHEDULE_IMAGE_SIZE_DEFAULT, dwn._estimate_item_size(re.sub(r' (width|height)="\d+"', '', item_str01_rx)))
+        print(f'{self._testMethodName} passed')
+
+
+class SessionPoolTests(TestCase):
+    @test_prepare()
+    def test_sessionpool01_reuse(self) -> None:
+        created: list[Session] = []
+        pool = SessionPool(lambda: created.append(Session()) or created[-1])
+        with pool.session() as ses1, pool.session() as ses2:
+            # a session is never shared by two users at once
+            self.assertIsNot(ses1, ses2)
+        with pool.session() as ses3:
+            self.assertIn(ses3, created)
+        self.assertEqual(2, len(created))
+        pool.close()
+        with pool.session():
+            self.assertEqual(3, len(created))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_sessionpool02_keep_alive(self) -> None:
+        with FileServer({'/1.html': b'<p>text</p>'}) as server, make_downloader(ProcModule.RS) as dwn:
+            dwn._parse_args(prepare_arglist(['sfw']))
+            for _ in range(3):
+                with dwn.html_sessions.session() as ses:
+                    self.assertEqual(b'<p>text</p>', ses.get(server.url('/1.html')).content)
+            self.assertEqual((1, 3), (dwn.connection_stats.connections, dwn.connection_stats.requests))
+        print(f'{self._testMethodName} passed')
+
+
+class RateLimitTests(TestCase):
+    @test_prepare()
+    def test_ratelimit01_token_bucket(self) -> None:
+        bucket = TokenBucket(10.0, 2)
+        self.assertEqual(0.0, bucket.reserve())
+        self.assertTrue(bucket.try_take())
+        self.assertFalse(bucket.try_take())
+        # taken in advance, taker waits for it
+        self.assertAlmostEqual(0.1, bucket.reserve(), delta=0.02)
+        self.assertAlmostEqual(0.2, bucket.reserve(), delta=0.02)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_ratelimit02_per_host(self) -> None:
+        limiter = RateLimiter(1.0, 1)
+        self.assertTrue(limiter.try_acquire('https://a.b/1'))
+        self.assertFalse(limiter.try_acquire('https://a.b/2'))
+        self.assertTrue(limiter.try_acquire('https://c.d/1'))
+        unlimited = RateLimiter(0.0, 0)
+        self.assertTrue(all(unlimited.try_acquire('https://a.b/1') for _ in range(10)))
+        self.assertEqual(0.0, unlimited.reserve('https://a.b/1'))
+        self.assertEqual('unlimited', str(unlimited))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_ratelimit03_shared(self) -> None:
+        with TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname:
+            # two limiters stand in for two processes using the same folder
+            limiter1 = SharedRateLimiter(pathlib.Path(tdirname), 1.0, 2)
+            limiter2 = SharedRateLimiter(pathlib.Path(tdirname), 1.0, 2)
+            self.assertTrue(limiter1.try_acquire('https://a.b/1'))
+            self.assertTrue(limiter2.try_acquire('https://a.b/2'))
+            self.assertFalse(limiter1.try_acquire('https://a.b/3'))
+            self.assertTrue(limiter2.try_acquire('https://c.d/1'))
+            self.assertAlmostEqual(1.0, limiter2.reserve('https://a.b/4'), delta=0.1)
+            self.assertTrue((pathlib.Path(tdirname) / 'a.b.bucket').is_file())
+        print(f'{self._testMethodName} passed')
+
+
+class AdaptiveConcurrencyTests(TestCase):
+    @test_prepare()
+    def test_concurrency01_aimd(self) -> None:
+        controller = AdaptiveConcurrency('items', 4, 8, lambda: None)
+        for _ in range(5):
+            with controller.slot():
+                pass
+        # grows by about one per 'limit' healthy completions
+        self.assertEqual(5, int(controller.limit))
+        with controller.slot():
+            AdaptiveConcurrency.report_overload()
+            # burst of rejections is one congestion event
+            AdaptiveConcurrency.report_overload()
+        self.assertEqual((2, 1), (int(controller.limit), controller.cuts))
+        self.assertEqual(5, int(controller.peak))
+        # outside of any stage nothing is reported
+        AdaptiveConcurrency.report_overload()
+        self.assertEqual(1, controller.cuts)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_concurrency02_joined(self) -> None:
+        controller = AdaptiveConcurrency('pages', 8, 8, lambda: None)
+        with controller.slot():
+            stage_slot = AdaptiveConcurrency.current_slot()
+
+            def helper() -> None:
+                with AdaptiveConcurrency.joined(stage_slot):
+                    AdaptiveConcurrency.report_overload()
+
+            thread = Thread(target=helper)
+            thread.start()
+            thread.join()
+            self.assertTrue(stage_slot.overloaded)
+        # overloaded slot does not grow the limit when released
+        self.assertEqual((4.0, 1), (controller.limit, controller.cuts))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_concurrency03_gate(self) -> None:
+        controller = AdaptiveConcurrency('items', 2, 2, lambda: None)
+        running: list[int] = []
+        peak: list[int] = [0]
+        lock = Lock()
+
+        def work() -> None:
+            with controller.slot():
+                with lock:
+                    running.append(1)
+                    peak[0] = max(peak[0], len(running))
+                time.sleep(0.02)
+                with lock:
+                    running.pop()
+
+        threads = [Thread(target=work) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(2, peak[0])
+        print(f'{self._testMethodName} passed')
+
+
+class TransferBudgetTests(TestCase):
+    @test_prepare()
+    def test_budget01_bytes(self) -> None:
+        budget = TransferBudget(1000, 0)
+        budget.consume(999)
+        self.assertEqual('', budget.exhausted())
+        budget.consume(1)
+        self.assertIn('1000 bytes', budget.exhausted())
+        unlimited = TransferBudget(0, 0)
+        unlimited.consume(Mem.GB)
+        self.assertEqual('', unlimited.exhausted())
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_budget02_deadline(self) -> None:
+        budget = TransferBudget(0, 0.05)
+        self.assertEqual('', budget.exhausted())
+        time.sleep(0.1)
+        self.assertIn('deadline', budget.exhausted())
+        print(f'{self._testMethodName} passed')
+
+
+class ValidatorTests(TestCase):
+    @test_prepare()
+    def test_validator01_byte_size(self) -> None:
+        self.assertEqual(1572864, valid_byte_size('1.5M'))
+        self.assertEqual(2048, valid_byte_size('2kb'))
+        self.assertEqual(Mem.GB, valid_byte_size('1G'))
+        self.assertEqual(100, valid_byte_size('100'))
+        for val in ('0', '-1K', 'M', 'abc', '1T'):
+            with self.assertRaises(VALIDATOR_ERRORS):
+                valid_byte_size(val)
+        self.assertEqual(0, valid_min_speed('0'))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_validator02_proxy_list(self) -> None:
+        with TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname:
+            list_path = pathlib.Path(tdirname) / 'proxies.txt'
+            list_path.write_text('# pool\nhttp://8.8.8.8:65333\nsocks5://8.8.4.4:1080 files  # fast\n\nhttp://1.1.1.1:3128 pages\n',
+                                 encoding=UTF8)
+            self.assertEqual((('http://8.8.8.8:65333', ProxyUses.ALL), ('socks5://8.8.4.4:1080', ProxyUses.FILES),
+                              ('http://1.1.1.1:3128', ProxyUses.PAGES)), valid_proxy_list(list_path.as_posix()))
+            for content in ('# nothing\n', 'http://8.8.8.8:65333 videos\n', 'http://8.8.8.8:65333 pages files\n', '8.8.8.8:65333\n'):
+                list_path.write_text(content, encoding=UTF8)
+                with self.assertRaises(VALIDATOR_ERRORS):
+                    valid_proxy_list(list_path.as_posix())
+        with self.assertRaises(VALIDATOR_ERRORS):
+            valid_proxy_list((pathlib.Path(CUR_PATH) / 'no_such_file.txt').as_posix())
+        print(f'{self._testMethodName} passed')
+
+
+class HttpCacheTests(TestCase):
+    @test_prepare()
+    def test_httpcache01_entries(self) -> None:
+        with TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname:
+            cache = HttpCache(pathlib.Path(tdirname), {1: 60, 2: 0}, 60)
+            self.assertIsNone(cache.get('https://a.b/1'))
+            cache.put('https://a.b/1', 200, b'body', etag='"e1"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT')
+            entry = cache.get('https://a.b/1')
+            self.assertEqual((200, b'body'), (entry.status, entry.body))
+            self.assertTrue(cache.is_fresh(entry, 1))
+            self.assertFalse(cache.is_fresh(entry, 2))
+            self.assertEqual({'If-None-Match': '"e1"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}, entry.validators())
+            # not modified: body is kept, validators may be updated
+            cache.refresh('https://a.b/1', entry, etag='"e2"')
+            entry = cache.get('https://a.b/1')
+            self.assertEqual((b'body', '"e2"'), (entry.body, entry.etag))
+            cache.put_missing('https://a.b/2')
+            missing = cache.get('https://a.b/2')
+            self.assertEqual((404, b''), (missing.status, missing.body))
+            self.assertTrue(cache.is_fresh(missing, 2))
+            self.assertEqual({}, missing.validators())
+            self.assertEqual((2, 1, 1, 1), (cache.misses, cache.revalidated, cache.hits, cache.missing_hits))
+        print(f'{self._testMethodName} passed')
+
+
+class PageCacheTests(TestCase):
+    @test_prepare()
+    def test_pagecache01_lru(self) -> None:
+        # parsed trees are not kept, sizes are exact
+        cache = PageCache(100, hot_hits=100)
+        cache.put('a', b'a' * 40)
+        cache.put('b', b'b' * 40)
+        self.assertIsNotNone(cache.get('a'))
+        # least recently used one goes first
+        cache.put('c', b'c' * 40)
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.evictions)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(80, cache.size)
+        # oversized newest entry is still kept
+        cache.put('d', b'd' * 150)
+        self.assertEqual(1, len(cache))
+        self.assertEqual(150, cache.size)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_pagecache02_hot_parsed(self) -> None:
+        cache = PageCache(Mem.MB, compress=True, hot_hits=2)
+        cache.put('a', b'<p>text</p>')
+        first = cache.get('a')
+        self.assertEqual('text', first.text)
+        size_cold = cache.size
+        cache.get('a')
+        # hot entry keeps its parsed tree, which is accounted for
+        self.assertGreater(cache.size, size_cold)
+        self.assertEqual('text', cache.get('a').text)
+        cache.clear()
+        self.assertEqual(0, cache.size)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_pagecache03_own_tree(self) -> None:
+        for hot_hits in (1, 0):
+            cache = PageCache(Mem.MB, hot_hits=hot_hits)
+            tree = BeautifulSoup('<p>text</p>', 'html.parser')
+            cache.put('a', b'<p>text</p>', tree)
+            # callers may modify their trees, kept one is never handed out
+            tree.p.string = 'changed'
+            for _ in range(3):
+                parsed = cache.get('a')
+                self.assertEqual('text', parsed.p.string)
+                parsed.p.decompose()
+        print(f'{self._testMethodName} passed')
+
+
+class RetryPolicyTests(TestCase):
+    @staticmethod
+    def _http_error(status: int, retry_after='') -> exceptions.HTTPError:
+        response = Response()
+        response.status_code = status
+        if retry_after:
+            response.headers['Retry-After'] = retry_after
+        return exceptions.HTTPError(response=response)
+
+    @test_prepare()
+    def test_retry01_retry_after(self) -> None:
+        policy = RetryPolicy(base=1.0, cap=30.0)
+        self.assertEqual(7.0, policy.backoff(0.0, self._http_error(429, '7')))
+        self.assertEqual(RETRY_AFTER_MAX, policy.backoff(0.0, self._http_error(503, '100000')))
+        for _ in range(20):
+            self.assertTrue(1.0 <= policy.backoff(2.0, self._http_error(503)) <= 6.0)
+            self.assertTrue(1.0 <= policy.backoff(20.0) <= 30.0)
+        # server requested delay closes the host right away
+        policy.on_failure('https://a.b/1', self._http_error(429, '7'))
+        self.assertTrue(6.0 < policy.wait_time('https://a.b/2') <= 7.0)
+        self.assertEqual(0.0, policy.wait_time('https://c.d/1'))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_retry02_circuit(self) -> None:
+        policy = RetryPolicy(failures_max=3)
+        for _ in range(2):
+            policy.on_failure('https://a.b/1', self._http_error(503))
+        # not an overload
+        policy.on_failure('https://a.b/1', self._http_error(404))
+        policy.on_failure('https://a.b/1', exceptions.ProxyError())
+        self.assertEqual(0.0, policy.wait_time('https://a.b/1'))
+        policy.on_failure('https://a.b/1', exceptions.ConnectionError())
+        self.assertEqual(1, policy.trips)
+        self.assertTrue(0.0 < policy.wait_time('https://a.b/1') <= CIRCUIT_COOLDOWN_BASE)
+        policy.on_success('https://a.b/1')
+        self.assertEqual(0.0, policy.wait_time('https://c.d/1'))
+        print(f'{self._testMethodName} passed')
+
+
+class DiskWriterTests(TestCase):
+    @test_prepare()
+    def test_writer01_ordering(self) -> None:
+        writer = DiskWriter(2, Mem.MB)
+        ofile = io.BytesIO(bytes(8))
+        commits: list[bytes] = []
+        try:
+            with writer.target(ofile) as target:
+                target.write(0, b'aaaa')
+                target.write(2, b'bbbb')
+                target.commit(lambda: commits.append(ofile.getvalue()))
+                target.write(6, b'cc')
+            # writes and commits are applied in submission order
+            self.assertEqual([b'aabbbb\x00\x00'], commits)
+            self.assertEqual(b'aabbbbcc', ofile.getvalue())
+            self.assertEqual(0, writer.queued)
+        finally:
+            writer.close()
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_writer02_backpressure(self) -> None:
+        writer = DiskWriter(1, 8)
+        queued: list[int] = []
+
+        class SlowFile(io.BytesIO):
+            def write(self, data: bytes) -> int:
+                queued.append(writer.queued)
+                time.sleep(0.01)
+                return super().write(data)
+
+        try:
+            with writer.target(SlowFile()) as target:
+                for i in range(10):
+                    target.write(i * 4, b'dddd')
+                # a single oversized piece is still accepted
+                target.write(40, b'e' * 20)
+            self.assertEqual(11, len(queued))
+            self.assertLessEqual(max(queued), 20)
+            self.assertLessEqual(max(queued[:10]), 8)
+        finally:
+            writer.close()
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_writer03_error(self) -> None:
+        writer = DiskWriter(1, Mem.MB)
+        ofile = io.BytesIO()
+        ofile.close()
+        try:
+            with self.assertRaises(OSError):
+                with writer.target(ofile) as target:
+                    target.write(0, b'data')
+        finally:
+            writer.close()
+        print(f'{self._testMethodName} passed')
+
+
+class HedgerTests(TestCase):
+    @test_prepare()
+    def test_hedger01_budget(self) -> None:
+        hedger = Hedger(lambda: None, max_rate=1.0, min_samples=3)
+        try:
+            for _ in range(3):
+                self.assertEqual(1, hedger.run('https://a.b/1', lambda: time.sleep(0.01) or 1, lambda: True))
+            self.assertGreater(hedger.deadline('https://a.b/1'), 0.0)
+            # refused duplicate does not use up hedge budget
+            self.assertEqual(2, hedger.run('https://a.b/1', lambda: time.sleep(0.2) or 2, lambda: False))
+            self.assertEqual(0, hedger.hedges)
+            calls: list[int] = []
+
+            def send() -> int:
+                calls.append(1)
+                time.sleep(0.5 if len(calls) == 1 else 0.0)
+                return len(calls)
+
+            self.assertEqual(2, hedger.run('https://a.b/1', send, lambda: True))
+            self.assertEqual((1, 1), (hedger.hedges, hedger.hedge_wins))
+        finally:
+            hedger.close()
+        print(f'{self._testMethodName} passed')
+
+
+class SingleFlightTests(TestCase):
+    @test_prepare()
+    def test_singleflight01_shared(self) -> None:
+        flights: SingleFlight[int] = SingleFlight()
+        release = Event()
+        calls: list[int] = []
+        results: list[int] = []
+
+        def call() -> int:
+            calls.append(1)
+            release.wait(5.0)
+            return 42
+
+        threads = [Thread(target=lambda: results.append(flights.do('key', call))) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while flights.calls < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(calls))
+        self.assertEqual([42, 42, 42], results)
+        self.assertEqual(2, flights.shared)
+        # finished flight is not reused
+        self.assertEqual(43, flights.do('key', lambda: 43))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_singleflight02_error(self) -> None:
+        flights: SingleFlight[int] = SingleFlight()
+        release = Event()
+        errors: list[Exception] = []
+
+        def call() -> int:
+            release.wait(5.0)
+            raise ValueError('failed')
+
+        def join() -> None:
+            try:
+                flights.do('key', call)
+            except ValueError as err:
+                errors.append(err)
+
+        threads = [Thread(target=join) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        while flights.calls < 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(2, len(errors))
+        self.assertIs(errors[0], errors[1])
+        print(f'{self._testMethodName} passed')
+
+
+class HostLimiterTests(TestCase):
+    @test_prepare()
+    def test_hostlimiter01_extra_slots(self) -> None:
+        limiter = HostLimiter(3)
+        with limiter.slot('https://a.b/1'):
+            with limiter.extra_slots('https://a.b/2', 4) as taken:
+                # never waits, takes only what is free
+                self.assertEqual(2, taken)
+                with limiter.extra_slots('https://a.b/3', 1) as taken_more:
+                    self.assertEqual(0, taken_more)
+                with limiter.extra_slots('https://c.d/1', 1) as taken_other:
+                    self.assertEqual(1, taken_other)
+            with limiter.extra_slots('https://a.b/4', 2) as taken:
+                self.assertEqual(2, taken)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_hostlimiter02_slot(self) -> None:
+        limiter = HostLimiter(2)
+        lock = Lock()
+        active: list[int] = [0, 0]
+
+        def work() -> None:
+            with limiter.slot('https://a.b/1'):
+                with lock:
+                    active[0] += 1
+                    active[1] = max(active)
+                time.sleep(0.05)
+                with lock:
+                    active[0] -= 1
+
+        threads = [Thread(target=work) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(2, active[1])
+        print(f'{self._testMethodName} passed')
+
+
+class ProxyPoolTests(TestCase):
+    @test_prepare()
+    def test_proxypool01_pick(self) -> None:
+        pool = ProxyPool((('http://8.8.8.8:1', ProxyUses.ALL), ('http://8.8.8.8:2', ProxyUses.FILES), ('http://8.8.8.8:3', ProxyUses.PAGES)))
+        self.assertEqual(3, len(pool))
+        for _ in range(10):
+            self.assertNotEqual('http://8.8.8.8:3', pool.pick(True))
+            self.assertNotEqual('http://8.8.8.8:2', pool.pick(False))
+        # faster one wins when both are healthy
+        pool.report('http://8.8.8.8:1', True, 0.1)
+        pool.report('http://8.8.8.8:2', True, 2.0)
+        self.assertTrue(all(pool.pick(True) == 'http://8.8.8.8:1' for _ in range(10)))
+        for _ in range(PROXY_FAILURES_MAX):
+            pool.report('http://8.8.8.8:1', False)
+        # quarantined proxy is skipped while others are available
+        self.assertEqual(1, pool.quarantines)
+        self.assertTrue(all(pool.pick(True) == 'http://8.8.8.8:2' for _ in range(10)))
+        self.assertEqual('http://8.8.8.8:3', pool.pick(False))
+        # with nothing healthy left the one released soonest is used, never a direct connection
+        for _ in range(PROXY_FAILURES_MAX):
+            pool.report('http://8.8.8.8:2', False)
+        self.assertEqual('http://8.8.8.8:1', pool.pick(True))
+        self.assertEqual('3 proxies, 2 quarantined now, 2 quarantine(s) total', str(pool))
+        print(f'{self._testMethodName} passed')
+
+
+class MirrorHealthTests(TestCase):
+    @test_prepare()
+    def test_mirrors01_pick(self) -> None:
+        throughput = HostThroughput()
+        mirrors = MirrorHealth(throughput)
+        links = ('https://a.b/1.jpg', 'https://c.d/1.jpg')
+        self.assertEqual(links[0], mirrors.pick(links[:1]))
+        # first link is used until both hosts are proven
+        for _ in range(MIRROR_MIN_SAMPLES):
+            mirrors.on_success(links[0])
+            throughput.record(links[0], Mem.MB, 1.0)
+        self.assertEqual(links[0], mirrors.pick(links))
+        for _ in range(MIRROR_MIN_SAMPLES):
+            mirrors.on_success(links[1])
+            throughput.record(links[1], 4 * Mem.MB, 1.0)
+        self.assertEqual(links[1], mirrors.pick(links))
+        self.assertEqual(1, mirrors.redirects)
+        # failing host is avoided
+        for _ in range(MIRROR_FAILURES_MAX):
+            mirrors.on_failure(links[1])
+        self.assertEqual(links[0], mirrors.pick(links))
+        for _ in range(MIRROR_FAILURES_MAX):
+            mirrors.on_failure(links[0])
+        # everything is banned, the one released soonest is used
+        self.assertEqual(links[1], mirrors.pick(links))
+        self.assertEqual('2 host ban(s), 2 file(s) sent to alternative host up front', str(mirrors))
+        print(f'{self._testMethodName} passed')
+
+
+class ManifestTests(TestCase):
+    @test_prepare()
+    def test_manifest01_formats(self) -> None:
+        with TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname:
+            dest = pathlib.Path(tdirname) / 'rx_1.jpg'
+            aria2_path = pathlib.Path(tdirname) / 'list.txt'
+            manifest = ManifestWriter(aria2_path, DownloadModes.ARIA2, {'User-Agent': 'ua'}, {'c1': 'v1'}, 'http://8.8.8.8:65333')
+            manifest.add('https://a.b/1.jpg', dest, 100, '76dfed93372eb7a373ffe2430379cfb1')
+            manifest.close()
+            self.assertEqual(['https://a.b/1.jpg', f'  dir={dest.parent.as_posix()}', '  out=rx_1.jpg',
+                              '  checksum=md5=76dfed93372eb7a373ffe2430379cfb1', '  header=User-Agent: ua', '  header=Cookie: c1=v1',
+                              '  all-proxy=http://8.8.8.8:65333'], aria2_path.read_text(encoding=UTF8).splitlines())
+            jsonl_path = pathlib.Path(tdirname) / 'list.jsonl'
+            manifest = ManifestWriter(jsonl_path, DownloadModes.JSONL, {}, {}, '')
+            manifest.add('https://a.b/1.jpg', dest, 100, '')
+            manifest.add('https://a.b/2.jpg', dest.with_name('rx_2.jpg'), 0, '')
+            manifest.close()
+            entries = [json.loads(line) for line in jsonl_path.read_text(encoding=UTF8).splitlines()]
+            self.assertEqual(2, manifest.count)
+            self.assertEqual({'url': 'https://a.b/1.jpg', 'path': dest.as_posix(), 'size': 100, 'md5': '',
+                              'headers': {}, 'cookies': {}, 'proxy': ''}, entries[0])
+        print(f'{self._testMethodName} passed')
+
+
+class ArchiveTests(TestCase):
+    @test_prepare()
+    def test_archive01_rolling(self) -> None:
+        for fmt in ARCHIVE_FORMATS:
+            with TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname:
+                dest_base = pathlib.Path(tdirname)
+                (dest_base / 'sub').mkdir()
+                files = [dest_base / 'rx_1.jpg', dest_base / 'sub' / 'rx_2.mp4', dest_base / 'rx_3.png']
+                for file in files:
+                    file.write_bytes(file.name.encode())
+                sink = ArchiveSink(dest_base, fmt, 2, 'rx_')
+                for file in files:
+                    sink.add(file)
+                sink.drain()
+                # every file is removed as soon as it is archived, archives are readable before they are closed
+                self.assertFalse(any(file.is_file() for file in files))
+                self.assertEqual(['rx_1.jpg', 'rx_2.mp4', 'rx_3.png'], sink.file_names(dest_base))
+                self.assertEqual(['rx_2.mp4'], sink.file_names(dest_base / 'sub'))
+                archives = [dest_base / f'rx_!archive_000{i:d}.{fmt}' for i in (1, 2)]
+                expected_names = [['rx_1.jpg', 'sub/rx_2.mp4'], ['rx_3.png']]
+                for closed in (False, True):
+                    if closed:
+                        sink.close()
+                    for archive, names in zip(archives, expected_names, strict=True):
+                        if fmt == ArchiveFormats.TAR:
+                            with tarfile.open(archive) as tar:
+                                self.assertEqual(names, tar.getnames())
+                                self.assertEqual(names[-1].encode().split(b'/')[-1], tar.extractfile(names[-1]).read())
+                        else:
+                            with zipfile.ZipFile(archive) as zipf:
+                                self.assertEqual(names, zipf.namelist())
+                                self.assertEqual(names[-1].encode().split(b'/')[-1], zipf.read(names[-1]))
+                self.assertEqual(3, sink.count)
+                index = (dest_base / 'rx_!archive_index.txt').read_text(encoding=UTF8).splitlines()
+                self.assertEqual([f'rx_1.jpg\trx_!archive_0001.{fmt}', f'sub/rx_2.mp4\trx_!archive_0001.{fmt}',
+                                  f'rx_3.png\trx_!archive_0002.{fmt}'], index)
+                # index is picked up by the next run, which starts a new archive
+                sink2 = ArchiveSink(dest_base, fmt, 0, 'rx_')
+                self.assertEqual(3, len(sink2.file_names(dest_base)))
+                files[0].write_bytes(b'1')
+                sink2.add(files[0])
+                sink2.close()
+                self.assertTrue((dest_base / f'rx_!archive_0003.{fmt}').is_file())
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_archive02_error(self) -> None:
+        with TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname:
+            dest_base = pathlib.Path(tdirname)
+            sink = ArchiveSink(dest_base, ArchiveFormats.TAR, 0, 'rx_')
+            sink.add(dest_base / 'rx_1.jpg')
+            sink.drain()
+            # failed file stops archiving, the rest stay in place
+            self.assertIsInstance(sink.error, OSError)
+            with self.assertRaises(OSError):
+                sink.add(dest_base / 'rx_2.jpg')
+            sink.close()
+            self.assertEqual(0, sink.count)
+        print(f'{self._testMethodName} passed')
+
+
+class PartialFileTests(TestCase):
+    @test_prepare()
+    def test_partial01_resume(self) -> None:
+        with TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname:
+            dest = pathlib.Path(tdirname) / 'file.mp4'
+            partial = PartialFile(dest)
+            self.assertEqual(0, partial.load('etag1', 250, 100, 3))
+            partial.part.write_bytes(bytes(250))
+            partial.mark_done(0)
+            partial.mark_done(2)
+            self.assertTrue(partial.meta.is_file())
+            # same remote file: verified chunks are restored, last chunk is short
+            resumed = PartialFile(dest)
+            self.assertEqual(100, resumed.saved_chunk_size('etag1', 250))
+            self.assertEqual(150, resumed.load('etag1', 250, 100, 3))
+            self.assertEqual({0, 2}, resumed.done)
+            # changed remote file starts over
+            self.assertEqual(0, PartialFile(dest).load('etag2', 250, 100, 3))
+            self.assertEqual(0, PartialFile(dest).saved_chunk_size('etag2', 250))
+            resumed.complete(dest)
+            self.assertTrue(dest.is_file())
+            self.assertFalse(resumed.part.is_file())
+            self.assertFalse(resumed.meta.is_file())
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_partial02_single_chunk(self) -> None:
+        with TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname:
+            partial = PartialFile(pathlib.Path(tdirname) / 'file.jpg')
+            partial.load('etag1', 50, 50, 1)
+            partial.part.write_bytes(bytes(50))
+            partial.mark_done(0)
+            # single chunk transfer keeps no sidecar
+            self.assertFalse(partial.meta.is_file())
+            partial.discard()
+            self.assertFalse(partial.part.is_file())
+        print(f'{self._testMethodName} passed')
+
+
+class FileDownloadTests(TestCase):
+    @test_prepare()
+    def test_download01_resume(self) -> None:
+        data = bytes(range(256)) * 1200
+        with (TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname,
+              FileServer({'/1.jpg': data}) as server, make_downloader(ProcModule.RS) as dwn):
+            dwn._parse_args(prepare_arglist(['sfw']))
+            dest = pathlib.Path(tdirname) / 'rs_1.jpg'
+            # previous run was interrupted having verified the middle one of three chunks
+            partial = PartialFile(dest)
+            partial.load('"/1.jpg"', len(data), 102400, 3)
+            partial.part.write_bytes(bytes(102400) + data[102400:204800] + bytes(102400))
+            partial.mark_done(1)
+            result = dwn.download_file(server.url('/1.jpg'), 'rs_1', dest, DownloadModes.FULL, False)
+            self.assertEqual((len(data), len(data)), (result.file_size, result.expected_size))
+            self.assertEqual(data, dest.read_bytes())
+            # chunk layout of the partial is kept, verified chunk is not requested again
+            self.assertEqual(['bytes=0-102399', 'bytes=204800-307199'], server.gets('/1.jpg'))
+            self.assertFalse(partial.part.is_file())
+            self.assertFalse(partial.meta.is_file())
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_download02_segments(self) -> None:
+        data = bytes(range(256)) * (DOWNLOAD_CHUNK_SIZE // 128 + 4)
+        with (TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname,
+              FileServer({'/1.mp4': data}) as server, make_downloader(ProcModule.RS) as dwn):
+            dwn._parse_args(prepare_arglist(['sfw', '-segments', '3']))
+            dest = pathlib.Path(tdirname) / 'rs_1.mp4'
+            result = dwn.download_file(server.url('/1.mp4'), 'rs_1', dest, DownloadModes.FULL, False)
+            self.assertEqual(len(data), result.file_size)
+            self.assertEqual(data, dest.read_bytes())
+            ranges = [f'bytes={start:d}-{min(start + DOWNLOAD_CHUNK_SIZE, len(data)) - 1:d}'
+                      for start in range(0, len(data), DOWNLOAD_CHUNK_SIZE)]
+            self.assertEqual(sorted(ranges), sorted(server.gets('/1.mp4')))
+            # HEAD connection plus one connection per segment
+            self.assertEqual(4, dwn.connection_stats.connections)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_download03_nohead(self) -> None:
+        data = bytes(range(256)) * 1200
+        with (TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname,
+              FileServer({'/1.jpg': data, '/2.jpg': data, '/3.jpg': data}) as server, make_downloader(ProcModule.RS) as dwn):
+            dwn._parse_args(prepare_arglist(['sfw', '-nohead']))
+
+            def requests_sent(path: str) -> tuple[int, list[str]]:
+                # range end depends on the chunk size adapted to host speed
+                return server.heads(path), [range_str.partition('-')[0] for range_str in server.gets(path)]
+
+            # file info comes with the first GET, which also brings the first (here the only) chunk
+            dest1 = pathlib.Path(tdirname) / 'rs_1.jpg'
+            result = dwn.download_file(server.url('/1.jpg'), 'rs_1', dest1, DownloadModes.FULL, False)
+            self.assertEqual((len(data), len(data)), (result.file_size, result.expected_size))
+            self.assertEqual(data, dest1.read_bytes())
+            self.assertEqual((0, ['bytes=0']), requests_sent('/1.jpg'))
+            # range is ignored by host, the whole file comes with the first GET
+            server.ranges = False
+            dest2 = pathlib.Path(tdirname) / 'rs_2.jpg'
+            result = dwn.download_file(server.url('/2.jpg'), 'rs_2', dest2, DownloadModes.FULL, False)
+            self.assertEqual(len(data), result.file_size)
+            self.assertEqual(data, dest2.read_bytes())
+            self.assertEqual((0, ['bytes=0']), requests_sent('/2.jpg'))
+            # listed size alone is enough to skip HEAD
+            server.ranges = True
+            dwn.skip_head = False
+            dest3 = pathlib.Path(tdirname) / 'rs_3.jpg'
+            result = dwn.download_file(server.url('/3.jpg'), 'rs_3', dest3, DownloadModes.FULL, False, size_hint=len(data))
+            self.assertEqual(len(data), result.file_size)
+            self.assertEqual((0, ['bytes=0']), requests_sent('/3.jpg'))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_download04_ratelimit(self) -> None:
+        data = bytes(range(256)) * 1200
+        for shared in (False, True):
+            with (TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname,
+                  FileServer({f'/{i:d}.jpg': data for i in range(1, 4)}) as server, make_downloader(ProcModule.RS) as dwn):
+                dwn._parse_args(prepare_arglist(['sfw', '-ratelimit', '2,1'] + (['-ratelimit_shared', tdirname] if shared else [])))
+                start = time.monotonic()
+                for i in range(1, 4):
+                    dest = pathlib.Path(tdirname) / f'rs_{i:d}.jpg'
+                    result = dwn.download_file(server.url(f'/{i:d}.jpg'), f'rs_{i:d}', dest, DownloadModes.FULL, False)
+                    self.assertEqual(len(data), result.file_size)
+                # one token per file (HEAD and GET together), the first one is free
+                self.assertGreaterEqual(time.monotonic() - start, 0.9)
+                self.assertEqual(6, len(server.requests))
+                self.assertEqual(shared, (pathlib.Path(tdirname) / '127.0.0.1.bucket').is_file())
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_download05_maxspeed(self) -> None:
+        data = bytes(range(256)) * 1200
+        with (TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname,
+              FileServer({'/1.jpg': data}) as server, make_downloader(ProcModule.RS) as dwn):
+            dwn._parse_args(prepare_arglist(['sfw', '-maxspeed', '200K']))
+            dest = pathlib.Path(tdirname) / 'rs_1.jpg'
+            start = time.monotonic()
+            result = dwn.download_file(server.url('/1.jpg'), 'rs_1', dest, DownloadModes.FULL, False)
+            self.assertEqual(data, dest.read_bytes())
+            # first second worth of bytes is a burst, the rest is paced
+            self.assertGreaterEqual(time.monotonic() - start, 0.4)
+            self.assertEqual(len(data), dwn.budget.bytes_done)
+            self.assertEqual(len(data), result.file_size)
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_download06_md5(self) -> None:
+        data = bytes(range(256)) * 1200
+        data_md5 = hashlib.md5(data).hexdigest()
+        data2 = bytes(range(256)) * 4100
+        with (TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname,
+              FileServer({'/1.jpg': data, '/2.mp4': data2}) as server, make_downloader(ProcModule.RS) as dwn):
+            dwn._parse_args(prepare_arglist(['sfw', '-segments', '2']))
+            # hash is computed while streaming, without any listed md5 to check against
+            dest1 = pathlib.Path(tdirname) / 'rs_1.jpg'
+            result = dwn.download_file(server.url('/1.jpg'), 'rs_1', dest1, DownloadModes.FULL, False)
+            self.assertEqual(data_md5, result.md5)
+            # listed md5 is not matched: file is discarded
+            result = dwn.download_file(server.url('/1.jpg'), 'rs_1', dest1.with_name('rs_1a.jpg'), DownloadModes.FULL, False,
+                                       md5='0' * 32, tries=1)
+            self.assertEqual((0, ''), (result.file_size, result.md5))
+            self.assertEqual(['rs_1.jpg'], sorted(file.name for file in pathlib.Path(tdirname).iterdir()))
+            # segmented transfer is hashed after it is complete, slow host gets smallest chunks
+            dest2 = pathlib.Path(tdirname) / 'rs_2.mp4'
+            dwn.host_throughput = HostThroughput()
+            dwn.host_throughput.record(server.url('/2.mp4'), 1, 1.0)
+            data2_md5 = hashlib.md5(data2).hexdigest()
+            result = dwn.download_file(server.url('/2.mp4'), 'rs_2', dest2, DownloadModes.FULL, False, md5=data2_md5)
+            self.assertEqual((len(data2), data2_md5), (result.file_size, result.md5))
+            self.assertEqual(3, len(server.gets('/2.mp4')))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_download07_defer(self) -> None:
+        data = bytes(range(256)) * 4100
+        ranges = ['bytes=0-524287', 'bytes=524288-1048575', 'bytes=1048576-1049599']
+        with (TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname,
+              FileServer({'/1.mp4': data, '/2.mp4': data}) as server, make_downloader(ProcModule.RS) as dwn):
+            dwn._parse_args(prepare_arglist(['sfw', '-path', tdirname]))
+
+            def slow_host() -> None:
+                # slow host gets smallest chunks
+                dwn.host_throughput = HostThroughput()
+                dwn.host_throughput.record(server.url('/'), 1, 1.0)
+
+            slow_host()
+            server.fail_once.add(('/1.mp4', ranges[1]))
+            dest = pathlib.Path(tdirname) / 'rs_1.mp4'
+            result = dwn.download_file(server.url('/1.mp4'), 'rs_1', dest, DownloadModes.FULL, False, tries=1)
+            # failed chunk is not retried in place, host slot is released and verified chunks are kept
+            self.assertEqual(0, result.file_size)
+            self.assertEqual(ranges[:2], server.gets('/1.mp4'))
+            partial = PartialFile(dest)
+            self.assertEqual(524288, partial.load('"/1.mp4"', len(data), 524288, 3))
+            self.assertEqual({0}, partial.done)
+            with dwn.extra_host_slots(server.url('/1.mp4'), ConnectionPools.FILE, 64) as free_slots:
+                self.assertEqual(dwn.host_limiters[ConnectionPools.FILE].limit, free_slots)
+            # failing item is deferred to the retry pass
+            slow_host()
+            server.fail_once.add(('/2.mp4', ranges[1]))
+            dest2 = pathlib.Path(tdirname) / 'rs_2.mp4'
+            dwn._download(server.url('/2.mp4'), 'rs_2', dest2)
+            self.assertEqual((0, 1), (dwn.success_count, len(dwn.deferred_items)))
+            dwn._retry_deferred()
+            self.assertEqual((1, 0, 0), (dwn.success_count, dwn.fail_count, len(dwn.deferred_items)))
+            self.assertEqual(data, dest2.read_bytes())
+            self.assertEqual(ranges[:2] + ranges[1:], server.gets('/2.mp4'))
+        print(f'{self._testMethodName} passed')
+
+    @test_prepare()
+    def test_download08_stall(self) -> None:
+        data = bytes(range(256)) * 1200
+        with (TemporaryDirectory(prefix=f'{APP_NAME}_{self._testMethodName}_') as tdirname,
+              FileServer({'/1.jpg': data}) as server, make_downloader(ProcModule.RS) as dwn,
+              patch('ruxx.network.TRANSFER_STALL_WINDOW', 0.3)):
+            dwn._parse_args(prepare_arglist(['sfw', '-minspeed', '1M']))
+            server.slow_once.add('/1.jpg')
+            dest = pathlib.Path(tdirname) / 'rs_1.jpg'
+            start = time.monotonic()
+            result = dwn.download_file(server.url('/1.jpg'), 'rs_1', dest, DownloadModes.FULL, False, tries=2)
+            # trickling transfer is dropped early and requested again over a fresh connection
+            self.assertLess(time.monotonic() - start, 5.0)
+            self.assertEqual((len(data), 1), (result.file_size, result.retries))
+            self.assertEqual(data, dest.read_bytes())
+            self.assertEqual(2, len(server.gets('/1.jpg')))
+        print(f'{self._testMethodName} passed')
+
 
 # Tests below require actual connection
 
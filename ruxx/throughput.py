@@ -0,0 +1,80 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from threading import Lock
+from urllib import parse as url_parse
+
+__all__ = ('HostThroughput', 'TransferMeter')
+
+
+class TransferMeter:
+    """
+    Single response body speed over a sliding window, detects connections trickling below minimum speed (0 never stalls).
+    Time spent in excluded() blocks is not counted
+    """
+    def __init__(self, min_speed: int, window: float) -> None:
+        self.min_speed = min_speed
+        self.window = window
+        self.start = time.monotonic()
+        self._samples: deque[tuple[float, int]] = deque()
+        self._window_bytes = 0
+        self._excluded_time = 0.0
+
+    def _now(self) -> float:
+        return time.monotonic() - self._excluded_time
+
+    @contextmanager
+    def excluded(self) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._excluded_time += time.monotonic() - start
+
+    def add(self, nbytes: int) -> bool:
+        """Registers received bytes, returns True if transfer is stalled"""
+        now = self._now()
+        self._samples.append((now, nbytes))
+        self._window_bytes += nbytes
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._window_bytes -= self._samples.popleft()[1]
+        # judge only after a full window so connection warm-up is not punished
+        return now - self.start >= self.window and self._window_bytes < self.min_speed * self.window
+
+    def elapsed(self) -> float:
+        return self._now() - self.start
+
+
+class HostThroughput:
+    """Smoothed per-connection download speed for each host, bytes per second"""
+    def __init__(self, smoothing=0.3) -> None:
+        self.smoothing = smoothing
+        self._speeds: dict[str, float] = {}
+        self._lock: Lock = Lock()
+
+    def record(self, url: str, nbytes: int, seconds: float) -> None:
+        if nbytes <= 0 or seconds <= 0.0:
+            return
+        host = url_parse.urlparse(url).hostname or ''
+        speed = nbytes / seconds
+        with self._lock:
+            old_speed = self._speeds.get(host)
+            self._speeds[host] = speed if old_speed is None else old_speed + (speed - old_speed) * self.smoothing
+
+    def speed(self, url: str) -> float:
+        """0 if nothing was downloaded from this host yet"""
+        with self._lock:
+            return self._speeds.get(url_parse.urlparse(url).hostname or '', 0.0)
+
+#
+#
+#########################################
@@ -7,14 +7,16 @@ Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
 #
 
 import datetime
+import hashlib
 import math
+import pathlib
 import sys
 import traceback
 from collections.abc import Iterable, MutableSequence
 from tkinter import messagebox
 from typing import Literal, Protocol, TypeVar
 
-from .defines import FMT_DATE, MIN_PYTHON_VERSION, MIN_PYTHON_VERSION_STR, SUBFOLDER_NAME_LEN_MAX, SUPPORTED_PLATFORMS
+from .defines import FMT_DATE, MIN_PYTHON_VERSION, MIN_PYTHON_VERSION_STR, SUBFOLDER_NAME_LEN_MAX, SUPPORTED_PLATFORMS, Mem
 from .gui_defines import OPTION_CMD_PATH_CMD, OPTION_CMD_PROXY_CMD, UNDERSCORE
 from .rex import re_replace_symbols_sub, re_uscore_mult
 
@@ -134,6 +136,14 @@ def sanitize_path_name(filename_base: str) -> str:
         filename = filename.replace('__', '_')
     return filename.strip('_')
 
+
+def file_md5(filepath: pathlib.Path) -> str:
+    hasher = hashlib.md5()
+    with open(filepath, 'rb') as hfile:
+        while chunk := hfile.read(Mem.MB):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
 #
 #
 #########################################
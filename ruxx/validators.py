@@ -13,7 +13,21 @@ from abc import ABC, abstractmethod
 from argparse import ArgumentError
 from ipaddress import IPv4Address
 
-from .defines import API_KEY_LEN_RX, DMODE_CHOICES, FMT_DATE, THREADS_MAX_ITEMS
+from .defines import (
+    API_KEY_LEN_RX,
+    DMODE_CHOICES,
+    FMT_DATE,
+    HOST_CONNECTIONS_MAX,
+    HTTP_CACHE_TTL_MISSING,
+    HTTP_CACHE_TTLS,
+    SEGMENTS_MAX_FILE,
+    THREADS_MAX_ITEMS,
+    THREADS_MAX_POOL,
+    UTF8,
+    ConnectionPools,
+    Mem,
+    ProxyUses,
+)
 from .gui_defines import (
     OPTION_VALUES_IMAGES,
     OPTION_VALUES_PARCHI,
@@ -49,14 +63,22 @@ __all__ = (
     'VideosCBValidator',
     'WindowPosValidator',
     'valid_api_key',
+    'valid_byte_size',
     'valid_date',
     'valid_download_mode',
     'valid_folder_name',
     'valid_folder_path',
+    'valid_host_connections',
+    'valid_http_cache_ttl',
     'valid_json',
     'valid_kwarg',
+    'valid_min_speed',
+    'valid_pool_threads',
     'valid_positive_int',
     'valid_proxy',
+    'valid_proxy_list',
+    'valid_rate_limit',
+    'valid_segment_count',
     'valid_thread_count',
     'valid_window_position',
 )
@@ -88,6 +110,23 @@ def valid_proxy(prox: str, with_type=True) -> str:
         raise ArgumentError
 
 
+def valid_proxy_list(pathstr: str) -> tuple[tuple[str, str], ...]:
+    try:
+        proxies = []
+        with open(pathstr.strip('\'"'), 'rt', encoding=UTF8) as infile:
+            for line in infile:
+                # 'type://a.d.d.r:port[ pages|files]', comments start with '#'
+                if parts := line.split('#', 1)[0].split():
+                    assert len(parts) <= 2
+                    use = parts[1] if len(parts) == 2 else ProxyUses.ALL
+                    assert use in (ProxyUses.PAGES, ProxyUses.FILES, ProxyUses.ALL)
+                    proxies.append((valid_proxy(parts[0]), use))
+        assert proxies
+        return tuple(proxies)
+    except Exception:
+        raise ArgumentError
+
+
 def valid_date(date: str) -> str:
     try:
         _ = datetime.datetime.strptime(date, FMT_DATE)
@@ -120,10 +159,69 @@ def valid_positive_int(val: str, *, lb=0, ub=4294967295) -> int:
         raise ArgumentError
 
 
+def valid_byte_size(val: str, *, lb=1) -> int:
+    try:
+        multipliers = {'': 1, 'K': Mem.KB, 'M': Mem.MB, 'G': Mem.GB}
+        size_str = val.upper().removesuffix('B')
+        mult = multipliers[size_str[-1]] if size_str[-1:] in multipliers else 1
+        size = int(float(size_str.rstrip('KMG')) * mult)
+        assert size >= lb
+        return size
+    except Exception:
+        raise ArgumentError
+
+
+def valid_min_speed(val: str) -> int:
+    return valid_byte_size(val, lb=0)
+
+
+def valid_rate_limit(val: str) -> tuple[float, int]:
+    try:
+        rate_str, burst_str = tuple(val.split(',', 1)) if ',' in val else (val, '0')
+        rate = float(rate_str)
+        assert 0.0 < rate <= 1000.0
+        return rate, valid_positive_int(burst_str, ub=1000)
+    except Exception:
+        raise ArgumentError
+
+
+def valid_http_cache_ttl(val: str) -> tuple[int, ...]:
+    try:
+        ttls = [valid_positive_int(ttl_str) * 60 for ttl_str in val.split(',')]
+        assert len(HTTP_CACHE_TTLS) <= len(ttls) <= len(HTTP_CACHE_TTLS) + 1
+        if len(ttls) == len(HTTP_CACHE_TTLS):
+            ttls.append(HTTP_CACHE_TTL_MISSING)
+        return tuple(ttls)
+    except Exception:
+        raise ArgumentError
+
+
 def valid_thread_count(val: str) -> int:
     return valid_positive_int(val, lb=1, ub=THREADS_MAX_ITEMS)
 
 
+def valid_pool_threads(val: str) -> tuple[int, ...]:
+    try:
+        counts = tuple(valid_positive_int(count_str, lb=1, ub=THREADS_MAX_POOL) for count_str in val.split(','))
+        assert len(counts) == len(ConnectionPools)
+        return counts
+    except Exception:
+        raise ArgumentError
+
+
+def valid_host_connections(val: str) -> tuple[int, ...]:
+    try:
+        limits = tuple(valid_positive_int(limit_str, lb=1, ub=HOST_CONNECTIONS_MAX) for limit_str in val.split(','))
+        assert len(limits) == len(ConnectionPools)
+        return limits
+    except Exception:
+        raise ArgumentError
+
+
+def valid_segment_count(val: str) -> int:
+    return valid_positive_int(val, lb=1, ub=SEGMENTS_MAX_FILE)
+
+
 def valid_folder_path(pathstr: str) -> pathlib.Path:
     try:
         newpath = pathlib.Path(pathstr.strip('\'"')).resolve()
@@ -0,0 +1,137 @@
+# coding=UTF-8
+"""
+Author: trickerer (https://github.com/trickerer, https://github.com/trickerer01)
+"""
+#########################################
+#
+#
+
+from __future__ import annotations
+
+from collections.abc import Callable
+from queue import SimpleQueue
+from threading import Condition, Lock, Thread
+from typing import BinaryIO
+
+__all__ = ('DiskWriter', 'WriteTarget')
+
+
+class WriteTarget:
+    """Open file written by a single writer thread, so its writes and commits are applied in submission order"""
+    def __init__(self, writer: DiskWriter, ofile: BinaryIO, queue: SimpleQueue) -> None:
+        self.ofile = ofile
+        self.error: OSError | None = None
+        self._writer = writer
+        self._queue = queue
+        self._pending = 0
+        self._cond = Condition()
+
+    def write(self, offset: int, data: bytes) -> None:
+        """Queues data to be written at offset, blocks while writer queue is full"""
+        self._submit(offset, data, None)
+
+    def commit(self, callback: Callable[[], None]) -> None:
+        """Flushes everything written so far, then calls back (from writer thread)"""
+        self._submit(-1, b'', callback)
+
+    def _submit(self, offset: int, data: bytes, callback: Callable[[], None] | None) -> None:
+        self.check()
+        self._writer.reserve(len(data))
+        with self._cond:
+            self._pending += 1
+        self._queue.put((self, offset, data, callback))
+
+    def apply(self, offset: int, data: bytes, callback: Callable[[], None] | None) -> None:
+        try:
+            if self.error is None:
+                if callback:
+                    self.ofile.flush()
+                    callback()
+                else:
+                    self.ofile.seek(offset)
+                    self.ofile.write(data)
+        except Exception as err:
+            self.error = err if isinstance(err, OSError) else OSError(str(err))
+        finally:
+            self._writer.release(len(data))
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def check(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+    def drain(self) -> None:
+        with self._cond:
+            while self._pending > 0:
+                self._cond.wait()
+
+    def __enter__(self) -> WriteTarget:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        # file must not be closed under pending writes
+        self.drain()
+        if exc_type is None:
+            self.check()
+
+
+class DiskWriter:
+    """Small pool of threads doing file writes for network workers, queued data size is limited"""
+    def __init__(self, threads: int, max_queued: int) -> None:
+        self.threads = threads
+        self.max_queued = max_queued
+        self.queued = 0
+        self._cond = Condition()
+        self._lock = Lock()
+        self._queues: list[SimpleQueue] = []
+        self._workers: list[Thread] = []
+        self._next = 0
+
+    def target(self, ofile: BinaryIO) -> WriteTarget:
+        with self._lock:
+            if not self._workers:
+                self._start()
+            queue = self._queues[self._next % self.threads]
+            self._next += 1
+        return WriteTarget(self, ofile, queue)
+
+    def reserve(self, nbytes: int) -> None:
+        with self._cond:
+            # a single oversized piece is still accepted by an empty queue
+            while self.queued > 0 and self.queued + nbytes > self.max_queued:
+                self._cond.wait()
+            self.queued += nbytes
+
+    def release(self, nbytes: int) -> None:
+        with self._cond:
+            self.queued -= nbytes
+            self._cond.notify_all()
+
+    def _start(self) -> None:
+        self._queues = [SimpleQueue() for _ in range(self.threads)]
+        self._workers = [Thread(target=self._work, args=(q,), name=f'DiskWriter{i + 1:d}', daemon=True)
+                         for i, q in enumerate(self._queues)]
+        for worker in self._workers:
+            worker.start()
+
+    @staticmethod
+    def _work(queue: SimpleQueue) -> None:
+        while (job := queue.get()) is not None:
+            target: WriteTarget
+            target, offset, data, callback = job
+            target.apply(offset, data, callback)
+
+    def close(self) -> None:
+        with self._lock:
+            for queue in self._queues:
+                queue.put(None)
+            for worker in self._workers:
+                worker.join()
+            self._queues.clear()
+            self._workers.clear()
+
+#
+#
+#########################################